@@ -1,15 +1,61 @@
+import os
 import sys
+import argparse
 import urllib.request
 import json
 import numpy as np
 import matplotlib.pyplot as plt
 
-def get_data(dataset_num):
-    url = f"http://hulk.cse.iitd.ac.in:3000/dataset?student_id=aib252556&dataset_num={dataset_num}"
+DATA_URL = "http://hulk.cse.iitd.ac.in:3000/dataset?student_id=aib252556&dataset_num={num}"
+# Fetched datasets are kept as .npy files here and memory-mapped on reuse.
+CACHE_DIR = os.environ.get("Q1_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "q1_datasets"))
+# Optional stand-in for the course server: a directory holding
+# dataset_<num>.npy / dataset_<num>.json, or a URL template with {num}.
+DATA_SOURCE = os.environ.get("Q1_DATA_SOURCE")
+
+def _fetch_json(url):
     with urllib.request.urlopen(url) as response:
         raw_data = response.read().decode('utf-8')
         data = json.loads(raw_data)
-    return np.array(data["X"])
+    return np.asarray(data["X"], dtype=np.float64)
+
+def _read_source(dataset_num, source):
+    if source is None:
+        return _fetch_json(DATA_URL.format(num=dataset_num))
+    if source.startswith(("http://", "https://")):
+        return _fetch_json(source.format(num=dataset_num))
+    npy_path = os.path.join(source, f"dataset_{dataset_num}.npy")
+    if os.path.exists(npy_path):
+        return load_dataset_file(npy_path)
+    return load_dataset_file(os.path.join(source, f"dataset_{dataset_num}.json"))
+
+def get_data(dataset_num, source=DATA_SOURCE, cache_dir=CACHE_DIR, refresh=False):
+    path = os.path.join(cache_dir, f"dataset_{dataset_num}.npy")
+    if refresh or not os.path.exists(path):
+        X = _read_source(dataset_num, source)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(X))
+        os.replace(tmp_path, path)
+    return np.load(path, mmap_mode='r')
+
+def load_dataset_file(path):
+    # Plain .npy arrays are memory-mapped; pickled {"X": ...} payloads and
+    # JSON dumps of the server response are decoded into memory.
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        pass
+    try:
+        data_obj = np.load(path, allow_pickle=True)
+        if isinstance(data_obj, np.ndarray) and data_obj.dtype != object:
+            return data_obj
+        return np.array(data_obj.item()["X"]) if hasattr(data_obj, 'item') else np.array(data_obj["X"])
+    except Exception:
+        with open(path, 'r') as f:
+            data_json = json.load(f)
+        return np.array(data_json["X"])
 
 def kmeans_plusplus(X, k):
     n_samples, n_features = X.shape
@@ -19,7 +65,7 @@ def kmeans_plusplus(X, k):
     centroids[0] = X[idx]
     
     for i in range(1, k):
-        distances = np.min(np.sum((X[:, np.newaxis] - centroids[:i])**2, axis=2), axis=1)
+        distances = np.min(_sq_dists(X, centroids[:i]), axis=1).astype(np.float64)
         
         total_dist = np.sum(distances)
         if total_dist == 0:
@@ -31,25 +77,223 @@ def kmeans_plusplus(X, k):
         
     return centroids
 
-def kmeans(X, k, max_iters=100, n_init=10):
+# Slack on the triangle-inequality bounds so float rounding in the drift
+# updates (and in the float32 distance kernel) can never skip a point whose
+# label would actually change.
+_BOUND_EPS = 1e-9
+# Rows per block in the distance kernel; bounds the (rows, k, d) temporary.
+_CHUNK_ROWS = 1 << 15
+# Hamerly keeps one lower bound per point and wins for small k; Elkan keeps
+# k of them and prunes better once there are many centroids.
+_ELKAN_MIN_K = 20
+
+def _bound_eps(dtype):
+    return max(_BOUND_EPS, 1e3 * np.finfo(dtype).eps)
+
+def _sq_dists(X, centroids):
+    # Squared distances in X's precision, one block of rows at a time. Every
+    # assignment goes through this kernel (or _pair_sq_dists, which does the
+    # same arithmetic), so all iteration modes see identical distances.
+    centroids = centroids.astype(X.dtype, copy=False)
+    out = np.empty((X.shape[0], centroids.shape[0]), dtype=X.dtype)
+    for start in range(0, X.shape[0], _CHUNK_ROWS):
+        block = X[start:start + _CHUNK_ROWS]
+        out[start:start + _CHUNK_ROWS] = np.sum((block[:, np.newaxis] - centroids)**2, axis=2)
+    return out
+
+def _pair_sq_dists(X, centroids):
+    return np.sum((X - centroids.astype(X.dtype, copy=False))**2, axis=1)
+
+def _sse(X, centroids):
+    # Per-block minima in X's precision, accumulated in float64.
+    total = 0.0
+    for start in range(0, X.shape[0], _CHUNK_ROWS):
+        total += np.sum(np.min(_sq_dists(X[start:start + _CHUNK_ROWS], centroids), axis=1), dtype=np.float64)
+    return total
+
+def _update_centroids(X, labels, centroids, k):
+    # Sums and counts for every cluster in a single pass over X.
+    n_features = X.shape[1]
+    counts = np.bincount(labels, minlength=k)
+    flat = (labels[:, np.newaxis] * n_features + np.arange(n_features)).ravel()
+    sums = np.bincount(flat, weights=X.ravel(), minlength=k * n_features).reshape(k, n_features)
+    new_centroids = sums / np.maximum(counts, 1)[:, np.newaxis]
+
+    # Re-seed empty clusters from the points worst served by their centroid.
+    empty = np.flatnonzero(counts == 0)
+    if empty.size:
+        errors = _pair_sq_dists(X, centroids[labels])
+        farthest = np.argpartition(errors, -empty.size)[-empty.size:]
+        farthest = farthest[np.argsort(-errors[farthest], kind='stable')]
+        new_centroids[empty] = X[farthest]
+    return new_centroids
+
+def _step_centroids(X, labels, centroids, k):
+    new_centroids = _update_centroids(X, labels, centroids, k)
+    shift = np.sqrt(np.sum((new_centroids - centroids)**2, axis=1))
+    return new_centroids, shift
+
+def _center_gaps(centroids):
+    cc = np.sqrt(_sq_dists(centroids, centroids))
+    np.fill_diagonal(cc, np.inf)
+    return cc, 0.5 * np.min(cc, axis=1)
+
+def _lloyd(X, centroids, k, max_iters, tol, stats):
+    n_samples = X.shape[0]
+    labels = None
+    for i in range(max_iters):
+        distances = _sq_dists(X, centroids)
+        new_labels = np.argmin(distances, axis=1)
+        changed = n_samples if labels is None else np.count_nonzero(new_labels != labels)
+        labels = new_labels
+        if stats is not None:
+            stats.append({"iteration": i, "computed": n_samples * k, "skipped": 0, "changed": changed})
+        if i > 0 and changed == 0:
+            break
+
+        centroids, shift = _step_centroids(X, labels, centroids, k)
+        if np.max(shift) <= tol:
+            break
+    return centroids
+
+def _hamerly(X, centroids, k, max_iters, tol, stats):
+    n_samples = X.shape[0]
+    eps = _bound_eps(X.dtype)
+    rows = np.arange(n_samples)
+    labels = np.zeros(n_samples, dtype=np.intp)
+    upper = np.full(n_samples, np.inf)
+    lower = np.zeros(n_samples)
+
+    for i in range(max_iters):
+        if i == 0:
+            check = rows
+            computed = 0
+        else:
+            _, half_gap = _center_gaps(centroids)
+            bound = np.maximum(half_gap[labels], lower)
+            check = np.flatnonzero(upper * (1 + eps) >= bound)
+            upper[check] = np.sqrt(_pair_sq_dists(X[check], centroids[labels[check]]))
+            computed = check.size
+            check = check[upper[check] * (1 + eps) >= bound[check]]
+
+        changed = 0
+        if check.size:
+            distances = _sq_dists(X[check], centroids)
+            new_labels = np.argmin(distances, axis=1)
+            changed = check.size if i == 0 else np.count_nonzero(new_labels != labels[check])
+            labels[check] = new_labels
+            nearest = np.sqrt(np.partition(distances, min(1, k - 1), axis=1))
+            upper[check] = nearest[:, 0]
+            lower[check] = nearest[:, 1] if k > 1 else np.inf
+            computed += check.size * k
+        if stats is not None:
+            stats.append({"iteration": i, "computed": computed, "skipped": n_samples * k - computed,
+                          "changed": changed})
+        if i > 0 and changed == 0:
+            break
+
+        old_centroids = centroids
+        centroids, shift = _step_centroids(X, labels, old_centroids, k)
+        if np.max(shift) <= tol:
+            break
+
+        upper += shift[labels]
+        if k > 1:
+            first, second = np.argsort(shift)[::-1][:2]
+            lower -= np.where(labels == first, shift[second], shift[first])
+    return centroids
+
+def _elkan_candidates(upper, lower, cc, own, eps):
+    ub = (upper * (1 + eps))[:, np.newaxis]
+    mask = (ub >= lower) & (ub >= 0.5 * cc[own])
+    mask[np.arange(own.size), own] = False
+    return mask
+
+def _elkan(X, centroids, k, max_iters, tol, stats):
+    n_samples = X.shape[0]
+    eps = _bound_eps(X.dtype)
+    labels = np.zeros(n_samples, dtype=np.intp)
+    upper = np.zeros(n_samples)
+    lower = np.zeros((n_samples, k))
+
+    for i in range(max_iters):
+        if i == 0:
+            distances = _sq_dists(X, centroids)
+            labels = np.argmin(distances, axis=1)
+            lower = np.sqrt(distances, dtype=np.float64)
+            upper = lower[np.arange(n_samples), labels]
+            computed = n_samples * k
+            changed = n_samples
+        else:
+            cc, half_gap = _center_gaps(centroids)
+            rows = np.flatnonzero(upper * (1 + eps) >= half_gap[labels])
+            mask = _elkan_candidates(upper[rows], lower[rows], cc, labels[rows], eps)
+            rows = rows[mask.any(axis=1)]
+            own = labels[rows]
+            local = np.arange(rows.size)
+            own_d2 = _pair_sq_dists(X[rows], centroids[own])
+            upper[rows] = np.sqrt(own_d2)
+            lower[rows, own] = upper[rows]
+            computed = rows.size
+
+            mask = _elkan_candidates(upper[rows], lower[rows], cc, own, eps)
+            ri, cj = np.nonzero(mask)
+            pair_d2 = _pair_sq_dists(X[rows[ri]], centroids[cj])
+            lower[rows[ri], cj] = np.sqrt(pair_d2)
+            computed += ri.size
+
+            # Centroids never evaluated are provably farther than the current
+            # one, so an argmin over the evaluated entries matches Lloyd's.
+            candidate_d2 = np.full((rows.size, k), np.inf)
+            candidate_d2[local, own] = own_d2
+            candidate_d2[ri, cj] = pair_d2
+            new_labels = np.argmin(candidate_d2, axis=1)
+            changed = np.count_nonzero(new_labels != own)
+            labels[rows] = new_labels
+            upper[rows] = np.sqrt(candidate_d2[local, new_labels])
+        if stats is not None:
+            stats.append({"iteration": i, "computed": computed, "skipped": n_samples * k - computed,
+                          "changed": changed})
+        if i > 0 and changed == 0:
+            break
+
+        centroids, shift = _step_centroids(X, labels, centroids, k)
+        if np.max(shift) <= tol:
+            break
+
+        upper += shift[labels]
+        lower = np.maximum(lower - shift, 0.0)
+    return centroids
+
+def kmeans(X, k, max_iters=100, n_init=10, algorithm="auto", stats=None, tol=1e-4, precision=None):
+    # algorithm: "lloyd" evaluates every point-to-centroid distance each
+    # iteration; "hamerly" / "elkan" skip the ones ruled out by the triangle
+    # inequality and reach exactly the same assignments. "auto" picks between
+    # the two by k. Pass a list as `stats` to collect per-iteration counts of
+    # computed and skipped distance evaluations. Iterations stop once no
+    # label changes or no centroid moves by more than `tol` relative to the
+    # spread of X. precision="float32" runs the distance kernel in single
+    # precision (halving its memory traffic) while centroid sums and the SSE
+    # are still accumulated in float64; by default X's own dtype is used.
+    if algorithm == "auto":
+        algorithm = "elkan" if k >= _ELKAN_MIN_K else "hamerly"
+    iterate = {"lloyd": _lloyd, "hamerly": _hamerly, "elkan": _elkan}[algorithm]
+    if precision is not None or X.dtype not in (np.float32, np.float64):
+        X = np.asarray(X, dtype=precision or np.float64)
+    shift_tol = tol * np.sqrt(np.mean(np.var(X, axis=0, dtype=np.float64)))
+
     best_centroids = None
     best_sse = np.inf
     
-    for _ in range(n_init):
+    for run in range(n_init):
         centroids = kmeans_plusplus(X, k)
-        
-        for i in range(max_iters):
-            distances = np.sum((X[:, np.newaxis] - centroids)**2, axis=2)
-            labels = np.argmin(distances, axis=1)
-            
-            new_centroids = np.array([X[labels == j].mean(axis=0) if np.any(labels == j) else centroids[j] for j in range(k)])
-            
-            if np.allclose(centroids, new_centroids):
-                break
-            centroids = new_centroids
+
+        run_stats = [] if stats is not None else None
+        centroids = iterate(X, centroids, k, max_iters, shift_tol, run_stats)
+        if stats is not None:
+            stats.extend(dict(entry, init=run) for entry in run_stats)
             
-        final_distances = np.sum((X[:, np.newaxis] - centroids)**2, axis=2)
-        sse = np.sum(np.min(final_distances, axis=1))
+        sse = _sse(X, centroids)
         
         if sse < best_sse:
             best_sse = sse
@@ -57,122 +301,148 @@ def kmeans(X, k, max_iters=100, n_init=10):
             
     return best_centroids, best_sse
 
+def sse_curve(X, ks, **kmeans_args):
+    return [kmeans(X, k, **kmeans_args)[1] for k in ks]
+
+def elbow_k(ks, sse_values):
+    # Optimal k using elbow method (geometric approach): the point farthest
+    # from the line from (k_1, SSE_1) to (k_n, SSE_n).
+    points = np.column_stack([ks, sse_values]).astype(np.float64)
+    p1, pn = points[0], points[-1]
+    line = pn - p1
+    offsets = p1 - points
+    distances = np.abs(line[0] * offsets[:, 1] - line[1] * offsets[:, 0]) / np.linalg.norm(line)
+    return ks[int(np.argmax(distances))]
+
+def _stratified_order(strata, rng):
+    # Random order within each stratum plus each point's rank inside it, so
+    # taking ranks below a per-stratum quota gives nested stratified samples.
+    order = rng.permutation(strata.shape[0])
+    order = order[np.argsort(strata[order], kind='stable')]
+    counts = np.bincount(strata)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    ranks = np.arange(order.size) - starts[strata[order]]
+    return order, ranks, counts
+
+def _stratified_sample(order, ranks, counts, size):
+    quota = np.floor(counts * size / order.size).astype(np.int64)
+    short = size - quota.sum()
+    if short > 0:
+        fractions = counts * size / order.size - quota
+        quota[np.argsort(-fractions, kind='stable')[:short]] += 1
+    strata = np.repeat(np.arange(counts.size), counts)
+    return np.sort(order[ranks < quota[strata]])
+
+def estimate_elbow(X, ks, start_size=None, growth=2.0, patience=2, seed=0, history=None, **kmeans_args):
+    # Runs the SSE sweep on stratified subsamples of growing size (SSE scaled
+    # up to the full N) until `patience` consecutive sizes agree on the elbow,
+    # then fits the full data once at the chosen k. Strata come from a pilot
+    # k-means with max(ks) clusters. Pass a list as `history` to collect the
+    # (sample size, elbow) pairs.
+    n_samples = X.shape[0]
+    rng = np.random.default_rng(seed)
+    pilot = X[np.sort(rng.choice(n_samples, min(n_samples, 50 * max(ks)), replace=False))]
+    pilot_centroids, _ = kmeans(pilot, min(max(ks), pilot.shape[0]), n_init=1, **kmeans_args)
+    order, ranks, counts = _stratified_order(np.argmin(_sq_dists(X, pilot_centroids), axis=1), rng)
+
+    size = start_size or max(50 * max(ks), n_samples // 100)
+    picks = []
+    while True:
+        size = min(int(size), n_samples)
+        idx = _stratified_sample(order, ranks, counts, size)
+        sse_values = [sse * n_samples / idx.size for sse in sse_curve(X[idx], ks, **kmeans_args)]
+        picks.append(elbow_k(ks, sse_values))
+        if history is not None:
+            history.append((idx.size, picks[-1]))
+        if size == n_samples or (len(picks) >= patience and len(set(picks[-patience:])) == 1):
+            break
+        size *= growth
+
+    optimal_k = picks[-1]
+    centroids, sse = kmeans(X, optimal_k, **kmeans_args)
+    return optimal_k, sse_values, centroids, sse
+
+# Largest relative SSE gap between the float32 and float64 paths that
+# --check-precision accepts.
+_PRECISION_RTOL = 1e-3
+
+def compare_precision(X, ks, seed=0, **kmeans_args):
+    # Runs the SSE sweep in float64 and float32 from the same seeding and
+    # returns both elbow picks and the largest relative SSE difference.
+    curves = {}
+    for precision in ("float64", "float32"):
+        np.random.seed(seed)
+        curves[precision] = np.array(sse_curve(X, ks, precision=precision, **kmeans_args))
+    rel_diff = np.max(np.abs(curves["float32"] - curves["float64"]) / np.maximum(curves["float64"], 1e-12))
+    return elbow_k(ks, curves["float64"]), elbow_k(ks, curves["float32"]), rel_diff
+
+def plot_elbows(results, path='plot.png'):
+    fig, axes = plt.subplots(1, len(results), figsize=(7 * len(results), 6), squeeze=False)
+    for ax, (title, ks, sse_values, optimal_k) in zip(axes[0], results):
+        ax.plot(ks, sse_values, marker='o', linestyle='-', color='b')
+        ax.axvline(x=optimal_k, linestyle=':', color='black', label=f'Optimal k = {optimal_k}')
+        ax.set_xlabel('Number of clusters (k)')
+        ax.set_ylabel('Objective value (SSE)')
+        ax.set_title(f'{title}: k-means Objective vs k')
+        ax.grid(True)
+        ax.legend()
+    plt.tight_layout()
+    plt.savefig(path)
+
 def solve():
-    if len(sys.argv) < 2:
-        print("Usage: python3 Q1.py <dataset_num> OR python3 Q1.py <path_to_dataset>.npy")
-        return
-
-    arg = sys.argv[1]
-    if arg.isdigit():
-        data = get_data(1)
-        data2 = get_data(2)
-        sse_values = []
-        ks = list(range(1, 16))
-        sse_values_2 = []
-        for k in ks:
-            _, sse = kmeans(data, k)
-            sse_values.append(sse)
-            _, sse2 = kmeans(data2, k)
-            sse_values_2.append(sse2)
-
-        p1 = np.array([ks[0], sse_values[0]])
-        pn = np.array([ks[-1], sse_values[-1]])
-        
-        distances = []
-        for i in range(len(ks)):
-            p = np.array([ks[i], sse_values[i]])
-            # Distance from point p to line segment p1-pn
-            d = np.abs(np.cross(pn - p1, p1 - p)) / np.linalg.norm(pn - p1)
-            distances.append(d)
-            
-        optimal_k = ks[np.argmax(distances)]
-        print("Optimal for dataset 1:",optimal_k)
-
-        for i in range(len(ks)):
-            p = np.array([ks[i], sse_values_2[i]])
-            # Distance from point p to line segment p1-pn
-            d = np.abs(np.cross(pn - p1, p1 - p)) / np.linalg.norm(pn - p1)
-            distances.append(d)
-            
-        optimal_k_2 = ks[np.argmax(distances)]
-        print("Optimal for dataset 2:",optimal_k_2)
-
-        fig, axes = plt.subplots(1, 2, figsize=(14, 6))
-
-        # ---- Plot 1 ----
-        axes[0].plot(ks, sse_values, marker='o', linestyle='-', color='b')
-        axes[0].axvline(x=optimal_k, linestyle=':', color='black', label=f'Optimal k = {optimal_k}')
-        axes[0].set_xlabel('Number of clusters (k)')
-        axes[0].set_ylabel('Objective value (SSE)')
-        axes[0].set_title('Dataset 1: k-means Objective vs k')
-        axes[0].grid(True)
-        axes[0].legend()
-        axes[0].set_title("Mode 1")
-
-        # ---- Plot 2 ----
-        axes[1].plot(ks, sse_values_2, marker='s', linestyle='--', color='r')
-        axes[1].axvline(x=optimal_k_2, linestyle=':', color='black', label=f'Optimal k = {optimal_k_2}')
-        axes[1].set_xlabel('Number of clusters (k)')
-        axes[1].set_ylabel('Objective value (SSE)')
-        axes[1].set_title('Dataset 2: k-means Objective vs k')
-        axes[1].grid(True)
-        axes[1].legend()
-        axes[1].set_title("Mode 2")
-
-        plt.tight_layout()
-        plt.grid(True)
-        plt.savefig('plot.png')
-    elif arg.endswith('.npy'):
-        try:
-            data_obj = np.load(arg, allow_pickle=True)
-            if isinstance(data_obj, np.ndarray):
-                data = data_obj
-            else:
-                data = np.array(data_obj.item()["X"]) if hasattr(data_obj, 'item') else np.array(data_obj["X"])
-        except Exception:
-            with open(arg, 'r') as f:
-                data_json = json.load(f)
-            data = np.array(data_json["X"])
-            sse_values = []
-            ks = list(range(1, 16))
-            
-            for k in ks:
-                _, sse = kmeans(data, k)
-                sse_values.append(sse)
+    parser = argparse.ArgumentParser(
+        description="k-means elbow analysis. Pass dataset numbers or paths to .npy/.json datasets.")
+    parser.add_argument('datasets', nargs='+', help="dataset number(s) or <path_to_dataset>.npy")
+    parser.add_argument('--source', default=DATA_SOURCE,
+                        help="local directory or URL template ({num}) to fetch datasets from")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="directory for cached .npy datasets")
+    parser.add_argument('--refresh', action='store_true', help="re-fetch datasets even if cached")
+    parser.add_argument('--algorithm', default="auto", choices=["auto", "lloyd", "hamerly", "elkan"])
+    parser.add_argument('--precision', default="float64", choices=["float64", "float32"],
+                        help="precision of the distance kernel (sums and SSE stay float64)")
+    parser.add_argument('--check-precision', action='store_true',
+                        help="compare the float32 and float64 SSE curves and elbow picks, then exit")
+    parser.add_argument('--fast', action='store_true',
+                        help="estimate the elbow on growing stratified subsamples, then fit only the chosen k")
+    args = parser.parse_args()
 
-            p1 = np.array([ks[0], sse_values[0]])
-            pn = np.array([ks[-1], sse_values[-1]])
-            
-            distances = []
-            for i in range(len(ks)):
-                p = np.array([ks[i], sse_values[i]])
-                # Distance from point p to line segment p1-pn
-                d = np.abs(np.cross(pn - p1, p1 - p)) / np.linalg.norm(pn - p1)
-                distances.append(d)
-                
-            optimal_k = ks[np.argmax(distances)]
-            print(optimal_k)
-            # Plotting
-            plt.figure(figsize=(10, 6))
-            plt.plot(ks, sse_values, marker='o', linestyle='-', color='b')
-            plt.axvline(x=optimal_k, linestyle=':', color='black', label=f'Optimal k = {optimal_k}')
-            plt.xlabel('Number of clusters (k)')
-            plt.ylabel('Objective value (SSE)')
-            plt.title('k-means Objective vs k')
-            plt.grid(True)
-            plt.legend()
-            plt.savefig('plot.png')
-            
-            # Optimal k using elbow method (geometric approach)
-            # Line from (k=1, SSE_1) to (k=15, SSE_15)
+    ks = list(range(1, 16))
+    results = []
+    for arg in args.datasets:
+        if arg.isdigit():
+            data = get_data(int(arg), source=args.source, cache_dir=args.cache_dir, refresh=args.refresh)
+            title = f"Dataset {arg}"
+        elif arg.endswith(('.npy', '.json')):
+            data = load_dataset_file(arg)
+            title = os.path.basename(arg)
+        else:
+            print("Invalid argument format.")
+            return
 
-    else:
-        print("Invalid argument format.")
-        return
+        if args.check_precision:
+            k64, k32, rel_diff = compare_precision(data, ks, algorithm=args.algorithm)
+            print(f"{title}: elbow float64={k64} float32={k32}, max relative SSE difference {rel_diff:.2e}")
+            if k64 != k32 or rel_diff > _PRECISION_RTOL:
+                sys.exit(1)
+            continue
+        data = np.asarray(data, dtype=args.precision)
 
+        if args.fast:
+            history = []
+            optimal_k, sse_values, _, _ = estimate_elbow(data, ks, history=history, algorithm=args.algorithm)
+            print(f"  elbow by sample size: {history}", file=sys.stderr)
+        else:
+            sse_values = sse_curve(data, ks, algorithm=args.algorithm)
+            optimal_k = elbow_k(ks, sse_values)
+        if arg.isdigit():
+            print(f"Optimal for dataset {arg}:", optimal_k)
+        else:
+            print(optimal_k)
+        results.append((title, ks, sse_values, optimal_k))
 
+    if results:
+        plot_elbows(results)
 
-    
 
 if __name__ == "__main__":
     solve()
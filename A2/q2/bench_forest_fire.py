@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Forest Fire Solver Benchmark
+============================
+Generates synthetic probabilistic graphs (power-law and grid landscapes)
+with seed sets of several sizes, runs the solver phases on them and writes
+a JSON report with per-phase wall times and work counters. The inputs are
+a pure function of the generator arguments, so reports from two solver
+versions can be compared run by run with --compare.
+
+    python bench_forest_fire.py --out after.json --compare before.json
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+
+import numpy as np
+
+import forest_fire as ff
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 1. Synthetic graphs
+# ─────────────────────────────────────────────────────────────────────────────
+
+def power_law_graph(n, avg_degree, rng, exponent=2.5):
+    """
+    Chung–Lu style directed graph: endpoints are drawn with probability
+    proportional to Pareto weights, so both degree tails follow a power law.
+    Returns parallel (u, v, p) arrays without self-loops.
+    """
+    weights = rng.pareto(exponent - 1, n) + 1
+    weights /= weights.sum()
+    m = int(n * avg_degree)
+    us = rng.choice(n, size=m, p=weights)
+    vs = rng.choice(n, size=m, p=weights)
+    keep = us != vs
+    us, vs = us[keep], vs[keep]
+    ps = np.round(rng.beta(2, 5, us.size), 4)
+    return us, vs, ps
+
+
+def grid_graph(n, rng, wind=0.15):
+    """
+    Square lattice landscape with edges to the four neighbours in both
+    directions. Probabilities vary smoothly across the grid (fuel) and are
+    higher downwind (towards +x).
+    """
+    side = max(2, int(np.sqrt(n)))
+    ids = np.arange(side * side).reshape(side, side)
+    fuel = rng.random((side, side))
+    for _ in range(3):
+        fuel = (fuel + np.roll(fuel, 1, 0) + np.roll(fuel, 1, 1) + np.roll(fuel, -1, 0) + np.roll(fuel, -1, 1)) / 5
+    us, vs, ps = [], [], []
+    for (dy, dx), bias in (((0, 1), wind), ((0, -1), -wind), ((1, 0), 0.0), ((-1, 0), 0.0)):
+        src = ids[max(0, -dy):side - max(0, dy), max(0, -dx):side - max(0, dx)]
+        dst = ids[max(0, dy):side - max(0, -dy), max(0, dx):side - max(0, -dx)]
+        us.append(src.ravel())
+        vs.append(dst.ravel())
+        ps.append(np.clip(fuel.ravel()[dst.ravel()] * 0.6 + bias + rng.normal(0, 0.05, dst.size), 0.01, 0.95))
+    return np.concatenate(us), np.concatenate(vs), np.round(np.concatenate(ps), 4)
+
+
+def pick_seeds(us, n_seeds, rng):
+    """Seeds among nodes with at least one out-edge."""
+    sources = np.unique(us)
+    return rng.choice(sources, size=min(n_seeds, sources.size), replace=False)
+
+
+def write_instance(workdir, name, us, vs, ps, seeds):
+    os.makedirs(workdir, exist_ok=True)
+    graph_file = os.path.join(workdir, f"{name}.graph.txt")
+    seed_file = os.path.join(workdir, f"{name}.seeds.txt")
+    with open(graph_file, 'w') as f:
+        f.write(''.join(f"{u} {v} {p}\n" for u, v, p in zip(us.tolist(), vs.tolist(), ps.tolist())))
+    with open(seed_file, 'w') as f:
+        f.write(''.join(f"{s}\n" for s in sorted(seeds.tolist())))
+    return graph_file, seed_file
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 2. One benchmark run
+# ─────────────────────────────────────────────────────────────────────────────
+
+def run_case(graph_file, seed_file, k, r, hops, world_seed=42, adaptive=False):
+    """Time every solver phase on one instance; returns the report entry."""
+    ff.reset_stats()
+    started = time.perf_counter()
+    with ff.timed('load'):
+        seeds = ff.load_seeds(seed_file)
+        full = ff.load_graph(graph_file, seeds)
+    with ff.timed('prune'):
+        graph = ff.prune_graph(full, ff.node_index(full, seeds), hops)
+
+    seed_idx = ff.node_index(graph, seeds)
+    sample = lambda count: ff.sample_worlds(graph, world_seed, 0, count)
+    selected = ff.greedy_select(graph, seed_idx, k, r, hops, sample, adaptive=adaptive)
+    total = time.perf_counter() - started
+
+    # Score on an independent set of worlds so runs are comparable
+    live = ff.sample_worlds(graph, world_seed + 1, 0, r)
+    before, after = ff.evaluate_blocking(graph, seed_idx, live, hops, ff.edge_ids(graph, selected))
+    return {
+        'graph': {'nodes': int(full.node_ids.size), 'edges': int(full.probs.size),
+                  'pruned_nodes': int(graph.node_ids.size), 'pruned_edges': int(graph.probs.size)},
+        'phases': {name: round(t, 6) for name, t in sorted(ff.PHASE_TIMES.items())},
+        'total_seconds': round(total, 6),
+        'counters': {name: int(v) for name, v in sorted(ff.COUNTERS.items())},
+        'sigma_baseline': float(before.mean()),
+        'sigma_blocked': float(after.mean()),
+        'selected': [list(edge) for edge in selected],
+    }
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 3. Reports
+# ─────────────────────────────────────────────────────────────────────────────
+
+def compare_reports(old, new):
+    """Print total-time ratios and blocked-spread differences for matching runs."""
+    old_runs = {run['id']: run for run in old['runs']}
+    print(f"{'run':<40} {'old s':>9} {'new s':>9} {'speedup':>8} {'d sigma':>9}")
+    for run in new['runs']:
+        prev = old_runs.get(run['id'])
+        if prev is None:
+            continue
+        speedup = prev['total_seconds'] / max(run['total_seconds'], 1e-9)
+        delta = run['sigma_blocked'] - prev['sigma_blocked']
+        print(f"{run['id']:<40} {prev['total_seconds']:>9.3f} {run['total_seconds']:>9.3f} "
+              f"{speedup:>7.2f}x {delta:>+9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark forest_fire.py on synthetic graphs.")
+    parser.add_argument('--kinds', nargs='+', choices=['powerlaw', 'grid'], default=['powerlaw', 'grid'])
+    parser.add_argument('--nodes', nargs='+', type=int, default=[2000, 20000])
+    parser.add_argument('--seeds', nargs='+', type=int, default=[1, 10], help="seed set sizes")
+    parser.add_argument('--hops', nargs='+', type=int, default=[-1, 4], help="negative for unlimited")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--r', type=int, default=256)
+    parser.add_argument('--degree', type=float, default=3.0, help="average out-degree of power-law graphs")
+    parser.add_argument('--adaptive', action='store_true')
+    parser.add_argument('--graph-seed', type=int, default=0, help="RNG seed of the generated instances")
+    parser.add_argument('--workdir', default=os.path.join(ff.CACHE_DIR, 'bench'),
+                        help="where generated instances are written")
+    parser.add_argument('--out', default='bench_forest_fire.json')
+    parser.add_argument('--compare', help="earlier report to compare against")
+    args = parser.parse_args()
+
+    report = {
+        'meta': {'python': platform.python_version(), 'numpy': np.__version__,
+                 'machine': platform.machine(), 'cpus': os.cpu_count(), 'commit': _git_commit(),
+                 'k': args.k, 'r': args.r, 'adaptive': args.adaptive, 'graph_seed': args.graph_seed},
+        'runs': [],
+    }
+    for kind in args.kinds:
+        for n in args.nodes:
+            rng = np.random.default_rng([args.graph_seed, n, kind == 'grid'])
+            if kind == 'grid':
+                us, vs, ps = grid_graph(n, rng)
+            else:
+                us, vs, ps = power_law_graph(n, args.degree, rng)
+            for n_seeds in args.seeds:
+                seeds = pick_seeds(us, n_seeds, np.random.default_rng([args.graph_seed, n, n_seeds]))
+                name = f"{kind}_n{n}_s{n_seeds}_g{args.graph_seed}"
+                graph_file, seed_file = write_instance(args.workdir, name, us, vs, ps, seeds)
+                for hops_arg in args.hops:
+                    hops = None if hops_arg < 0 else hops_arg
+                    run_id = f"{name}_h{hops_arg}"
+                    print(f"Running {run_id}...", file=sys.stderr, flush=True)
+                    run = run_case(graph_file, seed_file, args.k, args.r, hops, adaptive=args.adaptive)
+                    run.update(id=run_id, kind=kind, seed_count=n_seeds, hops=hops_arg)
+                    report['runs'].append(run)
+                    print(f"  {run['total_seconds']:.3f}s, sigma {run['sigma_baseline']:.2f} -> "
+                          f"{run['sigma_blocked']:.2f}", file=sys.stderr, flush=True)
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.out}", file=sys.stderr, flush=True)
+    if args.compare:
+        with open(args.compare) as f:
+            compare_reports(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,473 +1,1921 @@
-#!/usr/bin/env python3
-"""
-Forest Fire Spread Minimization — Reachability-Delta Greedy Solver
-==================================================================
-Selects exactly k edges to block in a probabilistic graph to minimize
-expected fire spread σ(R) from seed set A0.
-
-Strategy: Greedy selection using true marginal gain computed via
-reachability-delta scoring over r Monte-Carlo live-edge samples.
-"""
-
-import sys
-import random
-from collections import defaultdict, deque
-
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 1. I/O
-# ─────────────────────────────────────────────────────────────────────────────
-
-def load_graph(path):
-    """Return adj dict {u: [(v, p), ...]}, set of all nodes, set of all edges."""
-    adj = defaultdict(list)
-    nodes = set()
-    edges = set()
-    with open(path, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-            parts = line.split()
-            if len(parts) < 3:
-                continue
-            u, v, p = int(parts[0]), int(parts[1]), float(parts[2])
-            adj[u].append((v, p))
-            nodes.add(u)
-            nodes.add(v)
-            edges.add((u, v))
-    return dict(adj), nodes, edges
-
-
-def load_seeds(path):
-    seeds = set()
-    with open(path, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-            seeds.add(int(line))
-    return seeds
-
-
-def write_output(path, selected_edges):
-    with open(path, 'w') as f:
-        for u, v in selected_edges:
-            f.write(f"{u} {v}\n")
-
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 2. Pruning — keep only nodes/edges reachable from A0 within h hops
-# ─────────────────────────────────────────────────────────────────────────────
-
-def prune_graph(adj, seeds, hops):
-    """
-    BFS from seeds on the full graph (ignoring probabilities) up to `hops` steps.
-    Returns pruned adj dict and reachable node set.
-    If hops is None (unlimited), do full BFS.
-    """
-    reachable = set(seeds)
-    queue = deque(seeds)
-    if not queue or hops == 0:
-        return {}, reachable
-
-    pruned_adj = defaultdict(list)
-    adj_get = adj.get
-    queue_append = queue.append
-    queue_popleft = queue.popleft
-    reachable_add = reachable.add
-    empty = ()
-    depth = 0
-
-    while queue and (hops is None or depth < hops):
-        level_count = len(queue)
-        while level_count:
-            u = queue_popleft()
-            level_count -= 1
-            nbrs = adj_get(u, empty)
-            if not nbrs:
-                continue
-            pruned_nbrs = pruned_adj[u]
-            for v, p in nbrs:
-                pruned_nbrs.append((v, p))
-                if v not in reachable:
-                    reachable_add(v)
-                    queue_append(v)
-        depth += 1
-
-    return dict(pruned_adj), reachable
-
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 3. Sample live-edge subgraphs
-# ─────────────────────────────────────────────────────────────────────────────
-
-def sample_live_edge_graphs(adj, r, rng):
-    """
-    Generate r live-edge subgraphs.
-    Each subgraph is stored as a dict {u: [v1, v2, ...]} (no probabilities).
-    Returns list of subgraphs.
-    """
-    # Pre-collect all edges for fast sampling
-    all_edges = []
-    for u, nbrs in adj.items():
-        for v, p in nbrs:
-            all_edges.append((u, v, p))
-
-    subgraphs = []
-    rand = rng.random
-    for _ in range(r):
-        g = defaultdict(list)
-        for u, v, p in all_edges:
-            if rand() < p:
-                g[u].append(v)
-        subgraphs.append(dict(g))
-    return subgraphs
-
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 4. BFS-based reachability
-# ─────────────────────────────────────────────────────────────────────────────
-
-def bfs_reachable(adj_graph, seeds, hops=None):
-    """
-    BFS on a live-edge graph (no probabilities). Returns the set of reachable nodes.
-    hops=None means unlimited.
-    """
-    reached = set(seeds)
-    queue = deque(seeds)
-    if not queue or hops == 0:
-        return reached
-
-    adj_get = adj_graph.get
-    queue_append = queue.append
-    queue_popleft = queue.popleft
-    reached_add = reached.add
-    empty = ()
-    depth = 0
-
-    while queue and (hops is None or depth < hops):
-        level_count = len(queue)
-        while level_count:
-            u = queue_popleft()
-            level_count -= 1
-            for v in adj_get(u, empty):
-                if v not in reached:
-                    reached_add(v)
-                    queue_append(v)
-        depth += 1
-
-    return reached
-
-
-def bfs_reachable_without_edge(adj_graph, seeds, block_u, block_v, hops=None):
-    """
-    BFS on a live-edge graph skipping one specific edge (block_u -> block_v).
-    Returns the set of reachable nodes.
-    """
-    reached = set(seeds)
-    queue = deque(seeds)
-    if not queue or hops == 0:
-        return reached
-
-    adj_get = adj_graph.get
-    queue_append = queue.append
-    queue_popleft = queue.popleft
-    reached_add = reached.add
-    empty = ()
-    depth = 0
-
-    while queue and (hops is None or depth < hops):
-        level_count = len(queue)
-        while level_count:
-            u = queue_popleft()
-            level_count -= 1
-            nbrs = adj_get(u, empty)
-            if u == block_u:
-                for v in nbrs:
-                    if v == block_v or v in reached:
-                        continue
-                    reached_add(v)
-                    queue_append(v)
-                continue
-            for v in nbrs:
-                if v not in reached:
-                    reached_add(v)
-                    queue_append(v)
-        depth += 1
-
-    return reached
-
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 5. Core: Compute baseline reachable sets and candidate edges
-# ─────────────────────────────────────────────────────────────────────────────
-
-def compute_baseline_reachable(subgraphs, seeds, hops):
-    """Compute reachable set from seeds for each subgraph."""
-    baselines = []
-    for g in subgraphs:
-        reached = bfs_reachable(g, seeds, hops)
-        baselines.append(reached)
-    return baselines
-
-
-def get_candidate_edges(subgraphs, baselines, seeds):
-    """
-    Return dict: edge -> list of subgraph indices where that edge is live
-    and in the reachable subgraph (i.e., source node is reachable).
-    Edges originating from seeds are still candidates (blocking inbound to
-    non-seeds or outbound from seeds both matter).
-    """
-    candidates = defaultdict(list)
-    for i, g in enumerate(subgraphs):
-        reached = baselines[i]
-        for u in reached:
-            for v in g.get(u, []):
-                # Edge (u,v) is live and u is reachable
-                candidates[(u, v)].append(i)
-    return candidates
-
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 6. Greedy selection with lazy evaluation
-# ─────────────────────────────────────────────────────────────────────────────
-
-def compute_marginal_gain(edge, subgraphs, baseline_sizes, seeds, hops, relevant_indices, sample_count):
-    """
-    Compute the average marginal gain of blocking `edge` across relevant subgraphs.
-    Only considers subgraphs where the edge is live and reachable.
-    """
-    u, v = edge
-    total_gain = 0
-    for i in relevant_indices:
-        total_gain += baseline_sizes[i] - len(
-            bfs_reachable_without_edge(subgraphs[i], seeds, u, v, hops)
-        )
-    return total_gain / sample_count
-
-
-def get_one_hop_sources(adj, seeds):
-    one_hop = set()
-    adj_get = adj.get
-    one_hop_add = one_hop.add
-    empty = ()
-    for seed in seeds:
-        for v, _ in adj_get(seed, empty):
-            if v not in seeds:
-                one_hop_add(v)
-    return one_hop
-
-
-def extend_with_source_priority(selected, selected_set, k, adjs, source_set):
-    for graph_adj in adjs:
-        for u, nbrs in graph_adj.items():
-            if u not in source_set:
-                continue
-            for v, _ in nbrs:
-                edge = (u, v)
-                if edge in selected_set:
-                    continue
-                selected.append(edge)
-                selected_set.add(edge)
-                if len(selected) >= k:
-                    return
-
-
-def extend_with_remaining_edges(selected, selected_set, k, adjs):
-    for graph_adj in adjs:
-        for u, nbrs in graph_adj.items():
-            for v, _ in nbrs:
-                edge = (u, v)
-                if edge in selected_set:
-                    continue
-                selected.append(edge)
-                selected_set.add(edge)
-                if len(selected) >= k:
-                    return
-
-
-def smart_pad_selected(selected, k, primary_adj, seeds, fallback_adj=None):
-    if len(selected) >= k:
-        return selected
-
-    selected_set = set(selected)
-    adjs = [primary_adj]
-    if fallback_adj is not None and fallback_adj is not primary_adj:
-        adjs.append(fallback_adj)
-
-    one_hop_sources = set()
-    for graph_adj in adjs:
-        one_hop_sources.update(get_one_hop_sources(graph_adj, seeds))
-
-    extend_with_source_priority(selected, selected_set, k, adjs, seeds)
-    if len(selected) < k:
-        extend_with_source_priority(selected, selected_set, k, adjs, one_hop_sources)
-    if len(selected) < k:
-        extend_with_remaining_edges(selected, selected_set, k, adjs)
-
-    return selected
-
-
-def greedy_select(adj, seeds, k, r, hops, rng):
-    """
-    Main greedy loop. Selects k edges to block.
-    """
-    print(f"  Sampling {r} live-edge subgraphs...", file=sys.stderr, flush=True)
-    subgraphs = sample_live_edge_graphs(adj, r, rng)
-
-    print(f"  Computing baseline reachability...", file=sys.stderr, flush=True)
-    baselines = compute_baseline_reachable(subgraphs, seeds, hops)
-    baseline_sizes = [len(reached) for reached in baselines]
-
-    avg_baseline = sum(baseline_sizes) / r
-    print(f"  Avg baseline spread: {avg_baseline:.2f}", file=sys.stderr, flush=True)
-
-    print(f"  Building candidate edge set...", file=sys.stderr, flush=True)
-    candidates = get_candidate_edges(subgraphs, baselines, seeds)
-    print(f"  Candidate edges: {len(candidates)}", file=sys.stderr, flush=True)
-
-    selected = []
-
-    for round_num in range(k):
-        if not candidates:
-            print(f"  Round {round_num+1}: No more candidate edges.", file=sys.stderr, flush=True)
-            break
-
-        print(f"  Round {round_num+1}/{k}: Evaluating {len(candidates)} candidates...",
-              file=sys.stderr, flush=True)
-
-        # --- Warm-start proxy for large candidate sets ---
-        use_proxy = len(candidates) > 5 * k and k > 5
-        if use_proxy:
-            # Fast proxy: count how many subgraphs the edge appears in
-            # weighted by the number of nodes reachable from v in each
-            proxy_scores = {}
-            for edge, indices in candidates.items():
-                proxy_scores[edge] = len(indices)
-            # Keep top 5k candidates
-            shortlist_size = min(5 * k, len(candidates))
-            top_edges = sorted(proxy_scores, key=proxy_scores.get, reverse=True)[:shortlist_size]
-            eval_candidates = {e: candidates[e] for e in top_edges}
-            print(f"    Proxy shortlisted {len(eval_candidates)} edges",
-                  file=sys.stderr, flush=True)
-        else:
-            eval_candidates = candidates
-
-        best_edge = None
-        best_gain = -1
-
-        for edge, indices in eval_candidates.items():
-            if not indices:
-                continue
-            gain = compute_marginal_gain(
-                edge, subgraphs, baseline_sizes, seeds, hops, indices, r
-            )
-            if gain > best_gain:
-                best_gain = gain
-                best_edge = edge
-
-        if best_edge is None or best_gain <= 0:
-            # If no edge provides gain, pick any remaining candidate
-            if candidates:
-                best_edge = next(iter(candidates))
-                best_gain = 0.0
-            else:
-                break
-
-        selected.append(best_edge)
-        bu, bv = best_edge
-
-        print(f"    Selected edge ({bu}, {bv}) with gain {best_gain:.4f}",
-              file=sys.stderr, flush=True)
-
-        # Remove selected edge from candidates
-        if best_edge in candidates:
-            del candidates[best_edge]
-
-        # Update: remove the edge from all subgraphs and recompute reachability
-        # only for affected subgraphs
-        affected_indices = set()
-        for i, g in enumerate(subgraphs):
-            if bu in g and bv in g[bu]:
-                g[bu].remove(bv)
-                if not g[bu]:
-                    del g[bu]
-                affected_indices.add(i)
-
-        # Recompute baselines only for affected subgraphs
-        for i in affected_indices:
-            baselines[i] = bfs_reachable(subgraphs[i], seeds, hops)
-            baseline_sizes[i] = len(baselines[i])
-
-        # Rebuild candidate indices for affected subgraphs
-        # Remove stale indices and add new ones
-        edges_to_remove = []
-        for edge in list(candidates.keys()):
-            # Remove indices that were affected
-            new_indices = [idx for idx in candidates[edge] if idx not in affected_indices]
-            # Re-check affected subgraphs for this edge
-            eu, ev = edge
-            for i in affected_indices:
-                if eu in baselines[i]:  # eu must be reachable
-                    if eu in subgraphs[i] and ev in subgraphs[i].get(eu, []):
-                        new_indices.append(i)
-            candidates[edge] = new_indices
-            if not new_indices:
-                edges_to_remove.append(edge)
-
-        for edge in edges_to_remove:
-            del candidates[edge]
-
-    return selected
-
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 7. Main
-# ─────────────────────────────────────────────────────────────────────────────
-
-def main():
-    if len(sys.argv) != 7:
-        print("Usage: python forest_fire.py <graph_file> <seed_file> <output_file> <k> <r> <hops>",
-              file=sys.stderr)
-        sys.exit(1)
-
-    graph_file = sys.argv[1]
-    seed_file = sys.argv[2]
-    output_file = sys.argv[3]
-    k = int(sys.argv[4])
-    r = int(sys.argv[5])
-    hops_arg = int(sys.argv[6])
-    hops = None if hops_arg < 0 else hops_arg
-
-    print(f"Loading graph from {graph_file}...", file=sys.stderr, flush=True)
-    adj, nodes, edges = load_graph(graph_file)
-    print(f"  Nodes: {len(nodes)}, Edges: {len(edges)}", file=sys.stderr, flush=True)
-
-    seeds = load_seeds(seed_file)
-    print(f"  Seeds: {len(seeds)} -> {sorted(seeds)[:10]}{'...' if len(seeds)>10 else ''}",
-          file=sys.stderr, flush=True)
-
-    # Aggressive pruning
-    print(f"Pruning graph (hops={hops_arg})...", file=sys.stderr, flush=True)
-    pruned_adj, reachable = prune_graph(adj, seeds, hops)
-    pruned_edges = sum(len(nbrs) for nbrs in pruned_adj.values())
-    print(f"  Pruned: {len(reachable)} nodes, {pruned_edges} edges",
-          file=sys.stderr, flush=True)
-
-    rng = random.Random(42)
-
-    print(f"Running greedy selection (k={k}, r={r}, hops={hops_arg})...",
-          file=sys.stderr, flush=True)
-    selected = greedy_select(pruned_adj, seeds, k, r, hops, rng)
-
-    if len(selected) < k:
-        selected = smart_pad_selected(selected, k, pruned_adj, seeds, fallback_adj=adj)
-
-    selected = selected[:k]
-    write_output(output_file, selected)
-    print(f"Output written to {output_file} ({len(selected)} edges)", file=sys.stderr, flush=True)
-
-
-if __name__ == "__main__":
-    main()
+#!/usr/bin/env python3
+"""
+Forest Fire Spread Minimization — Reachability-Delta Greedy Solver
+==================================================================
+Selects exactly k edges to block in a probabilistic graph to minimize
+expected fire spread σ(R) from seed set A0.
+
+Strategy: Greedy selection using true marginal gain computed via
+reachability-delta scoring over r Monte-Carlo live-edge samples.
+"""
+
+import os
+import sys
+import time
+import heapq
+import hashlib
+import argparse
+import warnings
+import multiprocessing
+from statistics import NormalDist
+from contextlib import contextmanager
+from collections import Counter, defaultdict, namedtuple
+
+import numpy as np
+
+
+# Work counters and per-phase wall time of this process, for
+# bench_forest_fire.py (worker processes keep their own).
+COUNTERS = Counter()
+PHASE_TIMES = defaultdict(float)
+
+
+def reset_stats():
+    COUNTERS.clear()
+    PHASE_TIMES.clear()
+
+
+@contextmanager
+def timed(phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_TIMES[phase] += time.perf_counter() - start
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 1. I/O
+# ─────────────────────────────────────────────────────────────────────────────
+#
+# Inputs are parsed in large byte chunks: a chunk of well-formed lines goes
+# through np.fromstring in one call, and only chunks with comments, short
+# lines or other oddities fall back to line-by-line parsing. Node ids are
+# carried as float64 during parsing, so they must stay below 2**53.
+
+READ_CHUNK = 1 << 26
+
+# Pruned subgraphs are cached here as .npz files keyed by the graph and seed
+# contents and the hop limit.
+CACHE_DIR = os.environ.get("FOREST_FIRE_CACHE_DIR",
+                           os.path.join(os.path.expanduser("~"), ".cache", "forest_fire"))
+
+
+def _read_chunks(path, chunk_bytes=READ_CHUNK):
+    """Yield byte chunks of `path` that end on a line boundary."""
+    tail = b''
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            block = tail + block
+            cut = block.rfind(b'\n') + 1
+            tail = block[cut:]
+            if cut:
+                yield block[:cut]
+        if tail:
+            yield tail + b'\n'
+
+
+def _parse_rows_slow(chunk, ncols):
+    rows = []
+    for line in chunk.decode().splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        parts = line.split()
+        if len(parts) < ncols:
+            continue
+        rows.append([float(x) for x in parts[:ncols]])
+    return np.array(rows, dtype=np.float64).reshape(-1, ncols)
+
+
+def _tokens_per_line(chunk):
+    """Whitespace-separated token count of every line in a newline-terminated chunk."""
+    data = np.frombuffer(chunk, dtype=np.uint8)
+    space = data <= 32
+    starts = ~space
+    starts[1:] &= space[:-1]
+    ends = np.flatnonzero(data == 10)
+    return np.diff(np.searchsorted(np.flatnonzero(starts), ends), prepend=0)
+
+
+def _parse_rows(chunk, ncols):
+    """(rows, ncols) float64 array of the data lines in a byte chunk."""
+    # The fast path needs exactly ncols fields on every line: matching only
+    # the total would let a long line shift values into the next row
+    if b'#' not in chunk and (_tokens_per_line(chunk) == ncols).all():
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', DeprecationWarning)
+            try:
+                values = np.fromstring(chunk, dtype=np.float64, sep=' ')
+            except (ValueError, DeprecationWarning):
+                values = None
+        if values is not None and values.size == ncols * chunk.count(b'\n'):
+            return values.reshape(-1, ncols)
+    return _parse_rows_slow(chunk, ncols)
+
+
+def _read_rows(path, ncols):
+    parts = [_parse_rows(chunk, ncols) for chunk in _read_chunks(path)]
+    if not parts:
+        return np.empty((0, ncols), dtype=np.float64)
+    return np.concatenate(parts)
+
+
+def load_graph(path, seeds=()):
+    """Parse a "u v p" edge list straight into a CSRGraph (seeds are always nodes)."""
+    rows = _read_rows(path, 3)
+    return build_csr(rows[:, 0].astype(np.int64), rows[:, 1].astype(np.int64), rows[:, 2], seeds)
+
+
+def load_seeds(path):
+    return set(_read_rows(path, 1)[:, 0].astype(np.int64).tolist())
+
+
+def write_output(path, selected_edges):
+    # Written to a temporary file first: in anytime mode the answer is
+    # rewritten every round and the process may be killed at any moment
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        for u, v in selected_edges:
+            f.write(f"{u} {v}\n")
+    os.replace(tmp, path)
+
+
+def file_digest(path, chunk_bytes=READ_CHUNK):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_bytes), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def pruned_cache_path(cache_dir, graph_file, seeds, hops):
+    """Cache file for the pruned subgraph of (graph contents, seed set, hops)."""
+    seed_hash = hashlib.blake2b(np.array(sorted(seeds), dtype=np.int64).tobytes(), digest_size=8).hexdigest()
+    hop_tag = 'all' if hops is None else str(hops)
+    return os.path.join(cache_dir, f"pruned_{file_digest(graph_file)}_{seed_hash}_h{hop_tag}.npz")
+
+
+def save_graph(path, graph, **extra):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        np.savez(f, **graph._asdict(), **extra)
+    os.replace(tmp, path)
+
+
+def graph_digest(graph):
+    """Content hash of a CSRGraph."""
+    h = hashlib.blake2b(digest_size=16)
+    for array in graph:
+        h.update(np.ascontiguousarray(array).tobytes())
+    return h.hexdigest()
+
+
+def load_cached_graph(path):
+    """Return (CSRGraph, extra arrays) from a save_graph file."""
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in data.files}
+    graph = CSRGraph(*(arrays.pop(name) for name in CSRGraph._fields))
+    return graph, arrays
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 2. Pruning — keep only nodes/edges reachable from A0 within h hops
+# ─────────────────────────────────────────────────────────────────────────────
+
+def prune_graph(graph, seeds, hops):
+    """
+    BFS from seed indices on the full CSR graph (ignoring probabilities) up
+    to `hops` steps. Returns the subgraph of reached nodes and the out-edges
+    of nodes expanded before the hop limit, with edge order preserved.
+    If hops is None (unlimited), do full BFS.
+    """
+    n = graph.node_ids.size
+    reached = np.zeros(n, dtype=bool)
+    expanded = np.zeros(n, dtype=bool)
+    reached[seeds] = True
+    frontier = np.unique(seeds)
+    depth = 0
+
+    while frontier.size and (hops is None or depth < hops):
+        expanded[frontier] = True
+        heads = graph.indices[out_edges(graph.indptr, frontier)]
+        frontier = np.unique(heads[~reached[heads]])
+        reached[frontier] = True
+        depth += 1
+
+    keep_nodes = np.flatnonzero(reached)
+    remap = np.cumsum(reached) - 1
+    keep_edges = expanded[graph.src]
+    src = remap[graph.src[keep_edges]]
+    indptr = np.zeros(keep_nodes.size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=keep_nodes.size), out=indptr[1:])
+    return CSRGraph(graph.node_ids[keep_nodes], indptr, remap[graph.indices[keep_edges]],
+                    graph.probs[keep_edges], src)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 3. CSR representation
+# ─────────────────────────────────────────────────────────────────────────────
+
+CSRGraph = namedtuple('CSRGraph', ['node_ids', 'indptr', 'indices', 'probs', 'src'])
+
+
+def build_csr(us, vs, ps, seeds=()):
+    """
+    Convert parallel edge arrays (u, v, p) of original node ids into CSR
+    arrays over compact node indices 0..n-1. node_ids[i] is the original id
+    of node i; the out-edges of node i are edge ids indptr[i]..indptr[i+1]-1,
+    in input order, with heads indices[e], probabilities probs[e] and tails
+    src[e]. Seeds are always included as nodes.
+    """
+    us = np.asarray(us, dtype=np.int64)
+    vs = np.asarray(vs, dtype=np.int64)
+    node_ids, inverse = np.unique(np.concatenate([us, vs, np.fromiter(seeds, dtype=np.int64)]),
+                                  return_inverse=True)
+
+    src = inverse[:us.size]
+    order = np.argsort(src, kind='stable')
+    src = src[order]
+    indices = inverse[us.size:us.size + vs.size][order]
+    probs = np.asarray(ps, dtype=np.float64)[order]
+    indptr = np.zeros(node_ids.size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=node_ids.size), out=indptr[1:])
+    return CSRGraph(node_ids, indptr, indices, probs, src)
+
+
+def adjacency(graph):
+    """adj dict {u: [(v, p), ...]} of original ids, for the padding helpers."""
+    adj = defaultdict(list)
+    for u, v, p in zip(graph.node_ids[graph.src].tolist(), graph.node_ids[graph.indices].tolist(),
+                       graph.probs.tolist()):
+        adj[u].append((v, p))
+    return dict(adj)
+
+
+def node_index(graph, nodes):
+    """Map original node ids (all present in the graph) to CSR node indices."""
+    return np.searchsorted(graph.node_ids, np.fromiter(nodes, dtype=np.int64))
+
+
+def edge_tuple(graph, e):
+    return int(graph.node_ids[graph.src[e]]), int(graph.node_ids[graph.indices[e]])
+
+
+def edge_ids(graph, pairs):
+    """
+    Edge ids of all CSR edges matching the original (u, v) pairs, parallel
+    edges included. Pairs that are not in the graph are ignored.
+    """
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    n = graph.node_ids.size
+    pos = np.searchsorted(graph.node_ids, pairs).clip(max=max(n - 1, 0))
+    known = (graph.node_ids[pos] == pairs).all(axis=1) if n else np.zeros(len(pairs), dtype=bool)
+    wanted = np.unique(pos[known, 0] * n + pos[known, 1])
+    return np.flatnonzero(np.isin(graph.src * n + graph.indices, wanted))
+
+
+def out_edges(indptr, nodes):
+    """Edge ids of all out-edges of `nodes`, concatenated in node order."""
+    starts = indptr[nodes]
+    counts = indptr[nodes + 1] - starts
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(total)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 4. Sample live-edge subgraphs
+# ─────────────────────────────────────────────────────────────────────────────
+
+# Upper bound on uniforms drawn per RNG block while sampling.
+SAMPLE_BLOCK = 1 << 24
+
+
+def sample_live_edge_graphs(graph, r, rng):
+    """
+    Generate r live-edge samples over the CSR edge array.
+    Returns a packed bit matrix of shape (r, ceil(E / 8)), little bit order:
+    bit e of row i is set when edge e is live in sample i.
+    """
+    n_edges = graph.probs.size
+    live = np.empty((r, (n_edges + 7) // 8), dtype=np.uint8)
+    rows = max(1, SAMPLE_BLOCK // max(n_edges, 1))
+    for start in range(0, r, rows):
+        stop = min(r, start + rows)
+        draws = rng.random((stop - start, n_edges)) < graph.probs
+        live[start:stop] = np.packbits(draws, axis=1, bitorder='little')
+    return live
+
+
+# Worlds are a pure function of the graph and the RNG seed: sample i always
+# uses the i-th run of E uniforms from default_rng(seed). Any r is therefore
+# a prefix of any larger r, runs with different k or strategies share common
+# random numbers, and the packed matrix can be stored once and reused.
+
+def sample_worlds(graph, seed, start, stop):
+    """Samples start..stop-1 of the seeded world sequence, packed as above."""
+    rng = np.random.default_rng(seed)
+    rng.bit_generator.advance(start * graph.probs.size)
+    return sample_live_edge_graphs(graph, stop - start, rng)
+
+
+def world_store_path(cache_dir, graph, seed):
+    return os.path.join(cache_dir, f"worlds_{graph_digest(graph)}_s{seed}.npy")
+
+
+def load_worlds(cache_dir, graph, seed, r):
+    """
+    The first r worlds of (graph, seed) from the on-disk store, memory-mapped
+    read-only. Missing samples are drawn and appended to the store first.
+    """
+    path = world_store_path(cache_dir, graph, seed)
+    stored = np.load(path, mmap_mode='r') if os.path.exists(path) else None
+    have = 0 if stored is None else stored.shape[0]
+    if have < r:
+        print(f"  Sampling worlds {have}..{r - 1} into {path}...", file=sys.stderr, flush=True)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        out = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.uint8,
+                                        shape=(r, (graph.probs.size + 7) // 8))
+        rows = max(1, SAMPLE_BLOCK // max(out.shape[1], 1))
+        for start in range(0, r, rows):
+            stop = min(r, start + rows)
+            split = min(max(start, have), stop)
+            if split > start:
+                out[start:split] = stored[start:split]
+            if stop > split:
+                out[split:stop] = sample_worlds(graph, seed, split, stop)
+        out.flush()
+        del out, stored
+        os.replace(tmp, path)
+        stored = np.load(path, mmap_mode='r')
+    return stored[:r]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 5. Bitset reachability across all samples
+# ─────────────────────────────────────────────────────────────────────────────
+#
+# Samples are batched into uint64 words: row e of `edge_words` (E, W) holds
+# one bit per sample that is set when edge e is live there, and row v of a
+# `reached` matrix (n, W) has the bit set when node v is reached in that
+# sample. One BFS level for every sample at once is then
+#     reached[v] |= frontier[u] & edge_words[e]   for every edge e = (u, v),
+# so hop limits map directly onto the number of levels. Bit i lives in word
+# i // 64 at position i % 64 (little-endian byte order assumed).
+
+if hasattr(np, 'bitwise_count'):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT8 = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+    def _popcount(words):
+        counts = _POPCOUNT8[words.view(np.uint8)]
+        return counts.reshape(words.shape + (8,)).sum(axis=-1)
+
+
+def popcount_total(words):
+    """Total number of set bits."""
+    return int(_popcount(words).sum(dtype=np.int64))
+
+
+def sample_words(r):
+    """Word mask with the bits of samples 0..r-1 set."""
+    bits = np.zeros(((r + 63) // 64) * 64, dtype=bool)
+    bits[:r] = True
+    return np.packbits(bits, bitorder='little').view(np.uint64)
+
+
+def word_samples(words):
+    """Sample indices whose bits are set in a single (W,) word row."""
+    return np.flatnonzero(np.unpackbits(words.view(np.uint8), bitorder='little'))
+
+
+def sample_counts(words, r, block=1 << 14):
+    """Per-sample (column) bit counts of an (m, W) word matrix."""
+    counts = np.zeros(r, dtype=np.int64)
+    for start in range(0, words.shape[0], block):
+        bits = np.unpackbits(words[start:start + block].view(np.uint8), axis=1,
+                             count=r, bitorder='little')
+        counts += bits.sum(axis=0, dtype=np.int64)
+    return counts
+
+
+def edge_sample_words(live, n_edges, block=1 << 12):
+    """
+    Transpose the packed (r, ceil(E / 8)) sample matrix into per-edge sample
+    words of shape (E, ceil(r / 64)).
+    """
+    r = live.shape[0]
+    n_words = (r + 63) // 64
+    out = np.zeros((n_edges, n_words * 8), dtype=np.uint8)
+    for start in range(0, live.shape[1], block):
+        bits = np.unpackbits(live[:, start:start + block], axis=1, bitorder='little')
+        packed = np.packbits(bits.T, axis=1, bitorder='little')
+        first = start * 8
+        stop = min(n_edges, first + packed.shape[0])
+        out[first:stop, :packed.shape[1]] = packed[:stop - first]
+    return out.view(np.uint64)
+
+
+def propagate(graph, edge_words, seeds, seed_words, hops=None, blocked=-1, allowed=None,
+              return_nodes=False):
+    """
+    Level-synchronous BFS from `seeds` in every sample whose bit is set in
+    `seed_words` (one (W,) row for all seeds, or one row per seed),
+    optionally skipping edge id `blocked`. With `allowed`, an (n, W) matrix,
+    node v can only be reached in the samples set in allowed[v].
+    Returns the (n, W) reached matrix, plus the sorted ids of the nodes it
+    touched when return_nodes is set. hops=None means unlimited.
+    """
+    reached = np.zeros((graph.node_ids.size, edge_words.shape[1]), dtype=np.uint64)
+    touched = [np.empty(0, dtype=np.int64)]
+    frontier_words = np.broadcast_to(seed_words, (seeds.size, edge_words.shape[1]))
+    if allowed is not None:
+        frontier_words = frontier_words & allowed[seeds]
+    keep = frontier_words.any(axis=1)
+    frontier = seeds[keep]
+    frontier_words = frontier_words[keep]
+    reached[frontier] = frontier_words
+    touched.append(frontier)
+    depth = 0
+    COUNTERS['bfs_calls'] += 1
+
+    while frontier.size and (hops is None or depth < hops):
+        eids = out_edges(graph.indptr, frontier)
+        COUNTERS['nodes_visited'] += frontier.size
+        COUNTERS['edges_scanned'] += eids.size
+        owner = np.repeat(np.arange(frontier.size), graph.indptr[frontier + 1] - graph.indptr[frontier])
+        contrib = frontier_words[owner] & edge_words[eids]
+        if blocked >= 0:
+            contrib[eids == blocked] = 0
+        keep = contrib.any(axis=1)
+        heads = graph.indices[eids[keep]]
+        contrib = contrib[keep]
+        if not heads.size:
+            break
+
+        # OR together all contributions arriving at the same head node
+        order = np.argsort(heads, kind='stable')
+        frontier, starts = np.unique(heads[order], return_index=True)
+        merged = np.bitwise_or.reduceat(contrib[order], starts, axis=0)
+        frontier_words = merged & ~reached[frontier]
+        if allowed is not None:
+            frontier_words &= allowed[frontier]
+        keep = frontier_words.any(axis=1)
+        frontier = frontier[keep]
+        frontier_words = frontier_words[keep]
+        reached[frontier] |= frontier_words
+        touched.append(frontier)
+        depth += 1
+
+    if return_nodes:
+        return reached, np.unique(np.concatenate(touched))
+    return reached
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 6. Core: Compute baseline reachable sets and candidate edges
+# ─────────────────────────────────────────────────────────────────────────────
+
+def compute_baseline_reachable(graph, edge_words, seeds, hops, r):
+    """Reached matrix from seeds in all r samples."""
+    return propagate(graph, edge_words, seeds, sample_words(r), hops)
+
+
+def get_candidate_edges(graph, edge_words, reached):
+    """
+    Return the (E, W) candidate words: bit i of row e is set where edge e is
+    live in sample i and its source node is reachable there.
+    Edges originating from seeds are still candidates (blocking inbound to
+    non-seeds or outbound from seeds both matter).
+    """
+    return edge_words & reached[graph.src]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 7. Dominator-tree gains (unlimited hops)
+# ─────────────────────────────────────────────────────────────────────────────
+#
+# With no hop limit, blocking live edge (u, v) in one sample removes nodes
+# only if v loses every path from the seeds, and then it removes exactly
+# the nodes v dominates. Take the reachability graph of the sample with a
+# super-source feeding the seeds: (u, v) cuts v off iff it is the only
+# in-edge of v coming from a node that v does not itself dominate. So one
+# dominator tree per sample yields the exact gain of every candidate edge.
+
+def sample_bits(words, i):
+    """Boolean column i of an (m, W) word matrix."""
+    return ((words[:, i >> 6] >> np.uint64(i & 63)) & np.uint64(1)).astype(bool)
+
+
+def immediate_dominators(n_nodes, root, succ_ptr, succ, pred_ptr, pred):
+    """
+    Cooper–Harvey–Kennedy iterative dominators on a graph whose nodes are all
+    reachable from `root`. Adjacency is CSR-style Python lists.
+    Returns (idom, rpo): idom[root] == root, and rpo is a reverse postorder.
+    """
+    postorder = []
+    visited = [False] * n_nodes
+    visited[root] = True
+    stack = [[root, succ_ptr[root]]]
+    while stack:
+        top = stack[-1]
+        v, i = top
+        if i < succ_ptr[v + 1]:
+            top[1] = i + 1
+            w = succ[i]
+            if not visited[w]:
+                visited[w] = True
+                stack.append([w, succ_ptr[w]])
+        else:
+            stack.pop()
+            postorder.append(v)
+
+    rpo = postorder[::-1]
+    po_num = [0] * n_nodes
+    for num, v in enumerate(postorder):
+        po_num[v] = num
+
+    idom = [-1] * n_nodes
+    idom[root] = root
+    changed = True
+    while changed:
+        changed = False
+        for v in rpo[1:]:
+            new_idom = -1
+            for j in range(pred_ptr[v], pred_ptr[v + 1]):
+                p = pred[j]
+                if idom[p] == -1:
+                    continue
+                if new_idom == -1:
+                    new_idom = p
+                    continue
+                a, b = p, new_idom
+                while a != b:
+                    while po_num[a] < po_num[b]:
+                        a = idom[a]
+                    while po_num[b] < po_num[a]:
+                        b = idom[b]
+                new_idom = a
+            if idom[v] != new_idom:
+                idom[v] = new_idom
+                changed = True
+    return idom, rpo
+
+
+def sample_dominator_gains(graph, live, reached, seeds):
+    """
+    Exact gains for one sample given its live-edge and reached-node masks.
+    Returns (edge ids, gains) for the live edges whose blocking loses nodes.
+    """
+    nodes = np.flatnonzero(reached)
+    m = nodes.size
+    COUNTERS['dominator_trees'] += 1
+    COUNTERS['nodes_visited'] += m
+    local = np.full(graph.node_ids.size, -1, dtype=np.int64)
+    local[nodes] = np.arange(m)
+    eids = out_edges(graph.indptr, nodes)
+    eids = eids[live[eids]]
+
+    # Local graph: reached nodes 0..m-1 plus the super-source m
+    tails = np.concatenate([local[graph.src[eids]], np.full(seeds.size, m)])
+    heads = np.concatenate([local[graph.indices[eids]], local[seeds]])
+    by_tail = np.argsort(tails, kind='stable')
+    by_head = np.argsort(heads, kind='stable')
+    succ_ptr = np.zeros(m + 2, dtype=np.int64)
+    np.cumsum(np.bincount(tails, minlength=m + 1), out=succ_ptr[1:])
+    pred_ptr = np.zeros(m + 2, dtype=np.int64)
+    np.cumsum(np.bincount(heads, minlength=m + 1), out=pred_ptr[1:])
+    idom, rpo = immediate_dominators(
+        m + 1, m, succ_ptr.tolist(), heads[by_tail].tolist(), pred_ptr.tolist(), tails[by_head].tolist()
+    )
+
+    # Subtree sizes (idom precedes v in any RPO) and preorder intervals
+    size = [1] * (m + 1)
+    for v in reversed(rpo[1:]):
+        size[idom[v]] += size[v]
+    children = [[] for _ in range(m + 1)]
+    for v in rpo[1:]:
+        children[idom[v]].append(v)
+    tin = [0] * (m + 1)
+    clock = 0
+    stack = [m]
+    while stack:
+        v = stack.pop()
+        tin[v] = clock
+        clock += 1
+        stack.extend(children[v])
+    tin = np.array(tin, dtype=np.int64)
+    size = np.array(size, dtype=np.int64)
+
+    # In-edges from nodes outside v's dominator subtree
+    outside = (tin[tails] < tin[heads]) | (tin[tails] >= tin[heads] + size[heads])
+    entry_count = np.bincount(heads[outside], minlength=m + 1)
+    cut = outside[:eids.size] & (entry_count[heads[:eids.size]] == 1)
+    return eids[cut], size[heads[:eids.size][cut]]
+
+
+def update_dominator_gains(graph, edge_words, reached, seeds, sample_ids, totals, parts):
+    """
+    Recompute the dominator gains of `sample_ids` and swap their contribution
+    into `totals` (per-edge gain summed over samples) in place. parts[i] holds
+    the (edge ids, gains) currently counted for sample i, or None.
+    """
+    for i in sample_ids:
+        if parts[i] is not None:
+            totals[parts[i][0]] -= parts[i][1]
+        eids, sample_gains = sample_dominator_gains(
+            graph, sample_bits(edge_words, i), sample_bits(reached, i), seeds
+        )
+        totals[eids] += sample_gains
+        parts[i] = (eids, sample_gains)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 8. Sample shards
+# ─────────────────────────────────────────────────────────────────────────────
+#
+# The r live-edge samples are independent, so all per-sample state lives in
+# a WorldShard that owns a contiguous range of sample words. The serial
+# solver uses one shard holding every sample; ShardPool spreads the words
+# over worker processes that each keep their shard across rounds. Gains are
+# integer totals over a shard's samples, so summing shards reproduces the
+# serial numbers exactly.
+
+class WorldShard:
+    """Reachability, candidates and gain bookkeeping for a set of samples."""
+
+    def __init__(self, graph, seeds, hops, edge_words, r):
+        self.graph = graph
+        self.seeds = seeds
+        self.hops = hops
+        self.edge_words = edge_words
+        self.r = r
+        self.reached = compute_baseline_reachable(graph, edge_words, seeds, hops, r)
+        self.sizes = sample_counts(self.reached, r)
+        self.cand_words = get_candidate_edges(graph, edge_words, self.reached)
+        self.is_seed = np.zeros(graph.node_ids.size, dtype=bool)
+        self.is_seed[seeds] = True
+        if hops is None:
+            self.reverse = build_reverse_csr(graph)
+            self.dominator_totals = np.zeros(graph.probs.size, dtype=np.int64)
+            self.dominator_parts = [None] * r
+            update_dominator_gains(graph, edge_words, self.reached, seeds, range(r),
+                                   self.dominator_totals, self.dominator_parts)
+            # Samples changed by block() since their tree was built; their
+            # gains come from propagation until refresh_dominators()
+            self.dirty = np.zeros(edge_words.shape[1], dtype=np.uint64)
+
+    def baseline_total(self):
+        return int(self.sizes.sum())
+
+    def spread_moments(self):
+        """Sum and sum of squares of the per-sample spread sizes."""
+        return int(self.sizes.sum()), int((self.sizes ** 2).sum())
+
+    def candidate_mask(self):
+        return self.cand_words.any(axis=1)
+
+    def live_counts(self):
+        """Per edge id, the number of samples where it is live and reached."""
+        return _popcount(self.cand_words).sum(axis=1, dtype=np.int64)
+
+    def gain_bounds(self, edges, block=1 << 14):
+        """
+        Upper bound on gains(edges). Blocking (u, v) in a sample can only
+        lose nodes reached there deeper than u, and u is at least as deep as
+        its BFS level in the graph, so each sample where the edge is a
+        candidate counts its reached nodes below that level (all non-seed
+        nodes with unlimited hops).
+        """
+        edges = np.asarray(edges)
+        if self.hops is None:
+            levels = np.zeros(edges.size, dtype=np.int64)
+            deeper = (self.sizes - int(self.is_seed.sum()))[None, :]
+        else:
+            levels = np.minimum(bfs_levels(self.graph, self.seeds)[self.graph.src[edges]], self.hops)
+            # deeper[L] = nodes reached at depth > L in each sample
+            all_samples = sample_words(self.r)
+            deeper = np.zeros((self.hops + 1, self.r), dtype=np.int64)
+            for depth in range(self.hops):
+                within = propagate(self.graph, self.edge_words, self.seeds, all_samples, depth)
+                deeper[depth] = self.sizes - sample_counts(within, self.r)
+        out = np.zeros(edges.size, dtype=np.int64)
+        for start in range(0, edges.size, block):
+            bits = np.unpackbits(self.cand_words[edges[start:start + block]].view(np.uint8), axis=1,
+                                 count=self.r, bitorder='little')
+            block_levels = levels[start:start + block]
+            for level in np.unique(block_levels):
+                rows = block_levels == level
+                out[start:start + block][rows] = bits[rows] @ deeper[level]
+        return out
+
+    def gains(self, edges):
+        """Total gain over this shard's samples for each edge id in `edges`."""
+        if self.hops is None:
+            totals = self.dominator_totals[edges]
+            if self.dirty.any():
+                for j, edge in enumerate(edges):
+                    words = self.cand_words[edge] & self.dirty
+                    if words.any():
+                        totals[j] += compute_marginal_gain(edge, self.graph, self.edge_words, words,
+                                                           self.sizes, self.seeds, None)
+            return totals
+        return np.array([
+            compute_marginal_gain(edge, self.graph, self.edge_words, self.cand_words[edge],
+                                  self.sizes, self.seeds, self.hops)
+            for edge in edges
+        ], dtype=np.int64)
+
+    def sample_gains(self, edges):
+        """(len(edges), r) matrix of the gain of each edge id in each of this shard's samples."""
+        out = np.zeros((len(edges), self.r), dtype=np.int64)
+        for j, edge in enumerate(edges):
+            if self.hops is None:
+                for i, part in enumerate(self.dominator_parts):
+                    if part is not None:
+                        out[j, i] = part[1][part[0] == edge].sum()
+                words = self.cand_words[edge] & self.dirty
+            else:
+                words = self.cand_words[edge]
+            if words.any():
+                out[j] += sample_marginal_gains(edge, self.graph, self.edge_words, words,
+                                                self.sizes, self.seeds, self.hops)
+        return out
+
+    def refresh_dominators(self):
+        """Rebuild the dominator trees of the samples changed since they were built."""
+        if self.hops is None and self.dirty.any():
+            update_dominator_gains(self.graph, self.edge_words, self.reached, self.seeds,
+                                   word_samples(self.dirty), self.dominator_totals, self.dominator_parts)
+            self.dirty[:] = 0
+
+    def block(self, edge):
+        """
+        Remove `edge` from every sample and update the samples where it was
+        live and reached by deltas: only nodes downstream of its head are
+        re-examined, and their lost bits are cleared from the reached
+        matrix, the baseline sizes and the candidate words of their out-edges.
+        Returns (stale, candidate mask): stale marks the candidates that
+        shared one of the affected samples.
+        """
+        affected = self.cand_words[edge].copy()
+        stale = (self.cand_words & affected).any(axis=1)
+        self.edge_words[edge] = 0
+        self.cand_words[edge] = 0
+        if not affected.any():
+            return stale, self.candidate_mask()
+
+        lost_nodes, lost_words = self._lost_after_block(edge, affected)
+        self.reached[lost_nodes] &= ~lost_words
+        self.sizes -= sample_counts(lost_words, self.r)
+        eids = out_edges(self.graph.indptr, lost_nodes)
+        owner = np.repeat(np.arange(lost_nodes.size),
+                          self.graph.indptr[lost_nodes + 1] - self.graph.indptr[lost_nodes])
+        self.cand_words[eids] &= ~lost_words[owner]
+
+        if self.hops is None:
+            # Rebuilding every affected tree would cost as much as the
+            # whole graph in late rounds; the few gains CELF re-evaluates
+            # are propagated instead (see gains())
+            for i in word_samples(affected & ~self.dirty):
+                eids, sample_gains = self.dominator_parts[i]
+                self.dominator_totals[eids] -= sample_gains
+                self.dominator_parts[i] = None
+            self.dirty |= affected
+        return stale, self.candidate_mask()
+
+    def _lost_after_block(self, edge, affected):
+        """
+        Nodes (and per-node sample words) that stop being reached once `edge`,
+        already cleared from edge_words, is blocked in the `affected` samples.
+        """
+        graph = self.graph
+        head = graph.indices[edge:edge + 1]
+        # Everything that could lose the fire lies downstream of the head
+        down, down_nodes = propagate(graph, self.edge_words, head, affected, None,
+                                     allowed=self.reached, return_nodes=True)
+        if self.hops is not None:
+            # Depths matter under a hop limit: re-propagate the affected
+            # samples and compare inside the downstream region only
+            fresh = propagate(graph, self.edge_words, self.seeds, affected, self.hops)
+            lost = down[down_nodes] & ~fresh[down_nodes]
+        else:
+            # Re-enter the region from reached nodes outside it (or from seeds
+            # inside it) and keep whatever can still be reached
+            in_ptr, in_edges = self.reverse
+            pos = out_edges(in_ptr, down_nodes)
+            in_eids = in_edges[pos]
+            heads = np.repeat(down_nodes, in_ptr[down_nodes + 1] - in_ptr[down_nodes])
+            tails = graph.src[in_eids]
+            entry = self.edge_words[in_eids] & self.reached[tails] & ~down[tails] & down[heads]
+            seed_heads = down_nodes[self.is_seed[down_nodes]]
+            heads = np.concatenate([heads, seed_heads])
+            entry = np.concatenate([entry, down[seed_heads]])
+            keep = entry.any(axis=1)
+            heads, entry = heads[keep], entry[keep]
+            order = np.argsort(heads, kind='stable')
+            starts_nodes, starts = np.unique(heads[order], return_index=True)
+            if starts_nodes.size:
+                entry = np.bitwise_or.reduceat(entry[order], starts, axis=0)
+            else:
+                entry = entry[:0]
+            kept = propagate(graph, self.edge_words, starts_nodes, entry, None, allowed=down)
+            lost = down[down_nodes] & ~kept[down_nodes]
+        keep = lost.any(axis=1)
+        return down_nodes[keep], lost[keep]
+
+    def close(self):
+        pass
+
+
+def _shard_worker(conn, graph, seeds, hops, edge_words, r):
+    shard = WorldShard(graph, seeds, hops, edge_words, r)
+    conn.send(None)
+    while True:
+        method, args = conn.recv()
+        if method is None:
+            break
+        conn.send(getattr(shard, method)(*args))
+    conn.close()
+
+
+class ShardPool:
+    """
+    Same interface as WorldShard, backed by one worker process per shard.
+    Every call is broadcast to all workers and the answers are combined.
+    """
+
+    def __init__(self, graph, seeds, hops, edge_words, r, workers):
+        self.r = r
+        ctx = multiprocessing.get_context()
+        self.conns = []
+        self.procs = []
+        for cols in np.array_split(np.arange(edge_words.shape[1]), workers):
+            if not cols.size:
+                continue
+            shard_r = min(r, (cols[-1] + 1) * 64) - cols[0] * 64
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_shard_worker,
+                               args=(child, graph, seeds, hops, np.ascontiguousarray(edge_words[:, cols]), shard_r),
+                               daemon=True)
+            proc.start()
+            child.close()
+            self.conns.append(parent)
+            self.procs.append(proc)
+        for conn in self.conns:
+            conn.recv()
+
+    def _call(self, method, *args):
+        for conn in self.conns:
+            conn.send((method, args))
+        return [conn.recv() for conn in self.conns]
+
+    def baseline_total(self):
+        return sum(self._call('baseline_total'))
+
+    def spread_moments(self):
+        return _combine_moments(self._call('spread_moments'))
+
+    def candidate_mask(self):
+        return np.logical_or.reduce(self._call('candidate_mask'))
+
+    def live_counts(self):
+        return np.sum(self._call('live_counts'), axis=0)
+
+    def gain_bounds(self, edges):
+        return np.sum(self._call('gain_bounds', edges), axis=0)
+
+    def gains(self, edges):
+        return np.sum(self._call('gains', edges), axis=0)
+
+    def sample_gains(self, edges):
+        return np.concatenate(self._call('sample_gains', edges), axis=1)
+
+    def refresh_dominators(self):
+        self._call('refresh_dominators')
+
+    def block(self, edge):
+        results = self._call('block', edge)
+        return (np.logical_or.reduce([stale for stale, _ in results]),
+                np.logical_or.reduce([mask for _, mask in results]))
+
+    def close(self):
+        for conn in self.conns:
+            conn.send((None, ()))
+            conn.close()
+        for proc in self.procs:
+            proc.join()
+
+
+def _combine_moments(parts):
+    total, squares = zip(*parts)
+    return sum(total), sum(squares)
+
+
+class WorldStack:
+    """
+    Same interface again, over consecutive blocks of samples that may be
+    added over time (adaptive sampling). Every block must already have the
+    selected edges blocked when it is added.
+    """
+
+    def __init__(self, parts):
+        self.parts = list(parts)
+
+    @property
+    def r(self):
+        return sum(part.r for part in self.parts)
+
+    def add(self, part):
+        self.parts.append(part)
+
+    def baseline_total(self):
+        return sum(part.baseline_total() for part in self.parts)
+
+    def spread_moments(self):
+        return _combine_moments([part.spread_moments() for part in self.parts])
+
+    def candidate_mask(self):
+        return np.logical_or.reduce([part.candidate_mask() for part in self.parts])
+
+    def live_counts(self):
+        return np.sum([part.live_counts() for part in self.parts], axis=0)
+
+    def gain_bounds(self, edges):
+        return np.sum([part.gain_bounds(edges) for part in self.parts], axis=0)
+
+    def gains(self, edges):
+        return np.sum([part.gains(edges) for part in self.parts], axis=0)
+
+    def sample_gains(self, edges):
+        return np.concatenate([part.sample_gains(edges) for part in self.parts], axis=1)
+
+    def refresh_dominators(self):
+        for part in self.parts:
+            part.refresh_dominators()
+
+    def block(self, edge):
+        results = [part.block(edge) for part in self.parts]
+        return (np.logical_or.reduce([stale for stale, _ in results]),
+                np.logical_or.reduce([mask for _, mask in results]))
+
+    def close(self):
+        for part in self.parts:
+            part.close()
+
+
+def open_worlds(graph, seeds, hops, edge_words, r, workers=1):
+    """A WorldShard over all samples, or a ShardPool when workers > 1."""
+    workers = min(workers, edge_words.shape[1])
+    if workers > 1:
+        return ShardPool(graph, seeds, hops, edge_words, r, workers)
+    return WorldShard(graph, seeds, hops, edge_words, r)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 9. Greedy selection with lazy evaluation
+# ─────────────────────────────────────────────────────────────────────────────
+
+def compute_marginal_gain(edge, graph, edge_words, relevant_words, baseline_sizes, seeds, hops):
+    """
+    Compute the marginal gain of blocking edge id `edge`, summed over the
+    samples in `relevant_words` (edge live and reachable). Only those samples
+    are re-propagated, all of them in one batched pass.
+    """
+    reached = propagate(graph, edge_words, seeds, relevant_words, hops, blocked=edge)
+    before = int(baseline_sizes[word_samples(relevant_words)].sum())
+    return before - popcount_total(reached)
+
+
+def sample_marginal_gains(edge, graph, edge_words, relevant_words, baseline_sizes, seeds, hops):
+    """As compute_marginal_gain, but one gain per sample (zero outside `relevant_words`)."""
+    reached = propagate(graph, edge_words, seeds, relevant_words, hops, blocked=edge)
+    gains = np.zeros(baseline_sizes.size, dtype=np.int64)
+    relevant = word_samples(relevant_words)
+    gains[relevant] = baseline_sizes[relevant] - sample_counts(reached, baseline_sizes.size)[relevant]
+    return gains
+
+
+def get_one_hop_sources(adj, seeds):
+    one_hop = set()
+    adj_get = adj.get
+    one_hop_add = one_hop.add
+    empty = ()
+    for seed in seeds:
+        for v, _ in adj_get(seed, empty):
+            if v not in seeds:
+                one_hop_add(v)
+    return one_hop
+
+
+def extend_with_source_priority(selected, selected_set, k, adjs, source_set):
+    for graph_adj in adjs:
+        for u, nbrs in graph_adj.items():
+            if u not in source_set:
+                continue
+            for v, _ in nbrs:
+                edge = (u, v)
+                if edge in selected_set:
+                    continue
+                selected.append(edge)
+                selected_set.add(edge)
+                if len(selected) >= k:
+                    return
+
+
+def extend_with_remaining_edges(selected, selected_set, k, adjs):
+    for graph_adj in adjs:
+        for u, nbrs in graph_adj.items():
+            for v, _ in nbrs:
+                edge = (u, v)
+                if edge in selected_set:
+                    continue
+                selected.append(edge)
+                selected_set.add(edge)
+                if len(selected) >= k:
+                    return
+
+
+def padded_answer(selected, k, primary_adj, seeds, get_full_graph):
+    """
+    Exactly k edges: `selected` padded from the pruned graph first, and from
+    the full graph (only loaded through get_full_graph() when needed) after.
+    """
+    selected = smart_pad_selected(list(selected), k, primary_adj, seeds)
+    if len(selected) < k:
+        selected = smart_pad_selected(selected, k, primary_adj, seeds,
+                                      fallback_adj=adjacency(get_full_graph()))
+    return selected[:k]
+
+
+def smart_pad_selected(selected, k, primary_adj, seeds, fallback_adj=None):
+    if len(selected) >= k:
+        return selected
+
+    selected_set = set(selected)
+    adjs = [primary_adj]
+    if fallback_adj is not None and fallback_adj is not primary_adj:
+        adjs.append(fallback_adj)
+
+    one_hop_sources = set()
+    for graph_adj in adjs:
+        one_hop_sources.update(get_one_hop_sources(graph_adj, seeds))
+
+    extend_with_source_priority(selected, selected_set, k, adjs, seeds)
+    if len(selected) < k:
+        extend_with_source_priority(selected, selected_set, k, adjs, one_hop_sources)
+    if len(selected) < k:
+        extend_with_remaining_edges(selected, selected_set, k, adjs)
+
+    return selected
+
+
+# Adaptive sampling: initial sample count and default error probability of
+# the leader/runner-up test (also the level of the reported interval).
+ADAPTIVE_START = 128
+DELTA = 0.05
+
+
+def greedy_select(graph, seeds, k, r, hops, sample, workers=1, deadline=None, checkpoint=None,
+                  on_round=None, adaptive=False, delta=DELTA):
+    """
+    Main greedy loop on the CSR graph. `seeds` are CSR node indices, and
+    sample(count) returns the first `count` live-edge worlds.
+    Selects k edges to block and returns them as original (u, v) tuples.
+    With workers > 1 the samples are sharded over that many processes; the
+    selections are identical to the serial run.
+
+    CELF lazy greedy: a max-heap holds the last computed gain of every
+    candidate. Each round only the top entry is re-evaluated until it is
+    fresh, and blocking an edge marks stale only the candidates that share a
+    sample with it, since no other gain can have changed.
+
+    Anytime mode: with a `deadline` (time.perf_counter() value) r is scaled
+    down to what a pilot run says fits, and rounds stop once the next one is
+    not expected to finish in time. The pilot runs the first two greedy
+    rounds on PILOT_SAMPLES worlds, so both the setup and the per-round
+    cost enter the fit; when r stays at PILOT_SAMPLES the pilot's run just
+    carries on. on_round(selected) is called after every round. With a
+    `checkpoint` path the sampled worlds and the edges chosen so far are
+    saved there, and a matching checkpoint is resumed from.
+
+    Adaptive mode: start from ADAPTIVE_START samples and double them (up to
+    r) whenever the round's leader and runner-up are not separated by
+    empirical-Bernstein bounds at confidence 1 - delta.
+    """
+    max_r = r
+    state = load_checkpoint(checkpoint, graph, seeds, hops) if checkpoint else None
+    worlds = None
+    round_estimate = 0.0
+
+    def record(edges):
+        if checkpoint:
+            save_checkpoint_edges(checkpoint, edges)
+        if on_round is not None:
+            on_round([edge_tuple(graph, e) for e in edges])
+
+    if state is not None:
+        edge_words, r, chosen = state
+        max_r = max(max_r, r)
+        print(f"  Resuming from {checkpoint}: r={r}, {len(chosen)} edges already selected",
+              file=sys.stderr, flush=True)
+    else:
+        chosen = []
+        if deadline is not None and r > PILOT_SAMPLES:
+            # The pilot is the start of a real run on the first PILOT_SAMPLES
+            # worlds. After its second round (a full one: lazy re-evaluations
+            # plus a block) r is fitted; if it stays at PILOT_SAMPLES the
+            # same CELF run carries on, heap and gains included
+            print(f"  Pilot run on {PILOT_SAMPLES} samples...", file=sys.stderr, flush=True)
+            with timed('sample'):
+                edge_words = edge_sample_words(sample(PILOT_SAMPLES), graph.probs.size)
+            started = time.perf_counter()
+            with timed('baseline'):
+                worlds = open_worlds(graph, seeds, hops, edge_words.copy(), PILOT_SAMPLES, workers)
+            stamps = []
+            requested = r
+
+            def fit():
+                nonlocal max_r, r, round_estimate
+                setup = (stamps[0] if stamps else time.perf_counter()) - started
+                round_cost = stamps[1] - stamps[0] if len(stamps) > 1 else 0.0
+                max_r = fit_sample_count(setup + (k - 1) * round_cost, PILOT_SAMPLES, requested, deadline)
+                r = min(max_r, ADAPTIVE_START) if adaptive else max_r
+                round_estimate = round_cost * r / PILOT_SAMPLES
+                if r == PILOT_SAMPLES and checkpoint:
+                    save_checkpoint_worlds(checkpoint, graph, seeds, hops, edge_words, r)
+
+            def pilot_round(edges):
+                stamps.append(time.perf_counter())
+                if len(stamps) == 2:
+                    fit()
+                    if r != PILOT_SAMPLES:
+                        return True
+                if len(stamps) >= 2:
+                    record(edges)
+                return False
+
+            chosen = _celf_rounds(graph, worlds, k, (), pilot_round, deadline, _proxy(graph, seeds, hops, worlds),
+                                  cheap_gains=hops is None)
+            if len(stamps) < 2:
+                # The pilot ended (k reached or no candidates) before fitting
+                fit()
+                if r == PILOT_SAMPLES:
+                    record(chosen)
+            if r != PILOT_SAMPLES:
+                worlds.close()
+                worlds = None
+                chosen = []
+                with timed('sample'):
+                    edge_words = edge_sample_words(sample(r), graph.probs.size)
+        else:
+            r = min(max_r, ADAPTIVE_START) if adaptive else max_r
+            print(f"  Sampling {r} live-edge subgraphs...", file=sys.stderr, flush=True)
+            with timed('sample'):
+                edge_words = edge_sample_words(sample(r), graph.probs.size)
+        if checkpoint and worlds is None:
+            save_checkpoint_worlds(checkpoint, graph, seeds, hops, edge_words, r)
+
+    # A pilot that kept its worlds has already run every round
+    finished = worlds is not None
+    if not finished:
+        started = time.perf_counter()
+        print(f"  Computing baseline reachability...", file=sys.stderr, flush=True)
+        with timed('baseline'):
+            worlds = open_worlds(graph, seeds, hops, edge_words, r, workers)
+        per_sample = (time.perf_counter() - started) / r
+
+    def grow(selected):
+        # Double the samples; the new block is opened separately and has
+        # the selected edges blocked before it joins the stack
+        have = worlds.r
+        if have >= max_r or have % 64:
+            return False
+        new_r = min(max_r, 2 * have)
+        if deadline is not None and time.perf_counter() + 2 * per_sample * (new_r - have) > deadline:
+            return False
+        with timed('sample'):
+            all_words = edge_sample_words(sample(new_r), graph.probs.size)
+        if checkpoint:
+            save_checkpoint_worlds(checkpoint, graph, seeds, hops, all_words, new_r)
+            save_checkpoint_edges(checkpoint, selected)
+        with timed('baseline'):
+            block = open_worlds(graph, seeds, hops, np.ascontiguousarray(all_words[:, have // 64:]),
+                                new_r - have, workers)
+            for edge in selected:
+                block.block(edge)
+        worlds.add(block)
+        print(f"    Leader and runner-up tied, grew to r={new_r}", file=sys.stderr, flush=True)
+        return True
+
+    if adaptive and not finished:
+        worlds = WorldStack([worlds])
+    try:
+        if not finished:
+            with timed('update'):
+                for edge in chosen:
+                    worlds.block(edge)
+            # A resumed run starts with edges blocked: no proxy shortlist
+            proxy = None if chosen else _proxy(graph, seeds, hops, worlds)
+            chosen = _celf_rounds(graph, worlds, k, chosen, record, deadline, proxy,
+                                  grow if adaptive else None, delta, cheap_gains=hops is None,
+                                  round_estimate=round_estimate)
+
+        total, squares = worlds.spread_moments()
+        n = worlds.r
+        mean = total / n
+        half = NormalDist().inv_cdf(1 - delta / 2) * np.sqrt(max(squares / n - mean ** 2, 0.0) / n)
+        print(f"  Estimated sigma(R): {mean:.4f} +- {half:.4f} ({100 * (1 - delta):g}% CI, r={n})",
+              file=sys.stderr, flush=True)
+    finally:
+        worlds.close()
+    return [edge_tuple(graph, e) for e in chosen]
+
+
+def bernstein_radius(variance, n, value_range, delta):
+    """
+    Empirical-Bernstein confidence radius of a mean of n samples in
+    [0, value_range] with sample variance `variance`, at confidence 1 - delta.
+    """
+    log_term = np.log(3 / delta)
+    return np.sqrt(2 * variance * log_term / n) + 3 * value_range * log_term / n
+
+
+def _proxy(graph, seeds, hops, worlds):
+    # Exact gains are cheap with dominator trees; under a hop limit each
+    # costs a propagation, so the first round is shortlisted by proxy
+    if hops is None:
+        return None
+    with timed('proxy'):
+        return proxy_scores(graph, seeds, worlds.live_counts())
+
+
+def _celf_rounds(graph, worlds, k, selected=(), on_round=None, deadline=None, proxy=None,
+                 grow=None, delta=DELTA, cheap_gains=False, round_estimate=0.0):
+    """
+    CELF rounds from the current world state; returns all selected edge ids.
+    on_round(selected) may return True to stop after that round. With a
+    `deadline`, a round is only started if 1.5 times the slowest one so far
+    (at first, `round_estimate` seconds) still fits, and a round that hits
+    the deadline takes the best edge re-evaluated so far. On a fresh start
+    (nothing selected yet) with per-edge `proxy` scores, only the top
+    SHORTLIST_FACTOR * k candidates by proxy get exact initial gains; the
+    rest enter the heap as stale entries keyed by worlds.gain_bounds(), a
+    true upper bound, so CELF still finds the exact greedy maximum.
+
+    With `grow`, each round tests whether the leader beats the runner-up:
+    an empirical-Bernstein bound on their paired per-sample gain difference
+    (common worlds), with the range taken from the observed differences.
+    While the test fails, grow(selected) is asked for more samples, all
+    gains become stale and the top SHORTLIST_FACTOR * k entries (all of them
+    with `cheap_gains`, i.e. dominator-tree gains, after the trees of the
+    changed samples are rebuilt) are re-evaluated. Candidates below the leader are
+    never re-evaluated, as in plain CELF.
+    """
+    selected = list(selected)
+    r = worlds.r
+    avg_baseline = worlds.baseline_total() / r
+    print(f"  Avg baseline spread: {avg_baseline:.2f}", file=sys.stderr, flush=True)
+
+    is_candidate = worlds.candidate_mask()
+    candidates = np.flatnonzero(is_candidate)
+    print(f"  Candidate edges: {len(candidates)}", file=sys.stderr, flush=True)
+
+    gains = np.zeros(graph.probs.size, dtype=np.float64)
+    fresh = is_candidate.copy()
+    shortlist = candidates
+    if proxy is not None and not selected and candidates.size > SHORTLIST_FACTOR * k:
+        top = np.argpartition(-proxy[candidates], SHORTLIST_FACTOR * k - 1)[:SHORTLIST_FACTOR * k]
+        shortlist = candidates[top]
+    print(f"  Evaluating initial gains of {shortlist.size} candidates...", file=sys.stderr, flush=True)
+    with timed('initial_gains'):
+        if cheap_gains:
+            worlds.refresh_dominators()
+        gains[shortlist] = worlds.gains(shortlist) / r
+    if shortlist.size < candidates.size:
+        fresh[candidates] = False
+        fresh[shortlist] = True
+        rest = candidates[~fresh[candidates]]
+        gains[rest] = worlds.gain_bounds(rest) / r
+    heap = [(-gains[edge], edge) for edge in candidates.tolist()]
+    heapq.heapify(heap)
+    queued = is_candidate.copy()
+
+    def refresh_top():
+        # Re-evaluate stale entries from the top until the top one is fresh
+        evaluations = 0
+        while heap:
+            _, edge = heap[0]
+            if not is_candidate[edge]:
+                heapq.heappop(heap)
+                queued[edge] = False
+                continue
+            if fresh[edge]:
+                break
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            with timed('round_gains'):
+                gains[edge] = worlds.gains([edge])[0] / r
+            evaluations += 1
+            fresh[edge] = True
+            heapq.heapreplace(heap, (-gains[edge], edge))
+        return evaluations
+
+    def tied(leader, runner):
+        with timed('tie_tests'):
+            diff = np.subtract(*worlds.sample_gains([leader, runner]))
+        if not diff.any():
+            # Interchangeable on every sample so far; more samples won't help
+            return False
+        return diff.mean() <= bernstein_radius(diff.var(), r, np.ptp(diff), delta)
+
+    slowest = round_estimate
+    for round_num in range(len(selected), k):
+        started = time.perf_counter()
+        if deadline is not None and started + 1.5 * slowest > deadline:
+            print(f"  Round {round_num+1}: Time budget reached, stopping.", file=sys.stderr, flush=True)
+            break
+
+        evaluations = refresh_top()
+        while grow is not None and heap:
+            leader = heapq.heappop(heap)
+            evaluations += refresh_top()
+            separated = not heap or not tied(leader[1], heap[0][1])
+            heapq.heappush(heap, leader)
+            if separated or not grow(selected):
+                break
+            r = worlds.r
+            is_candidate = worlds.candidate_mask()
+            fresh[:] = False
+            queued |= is_candidate
+            pool = np.flatnonzero(queued & is_candidate)
+            if not cheap_gains and pool.size > SHORTLIST_FACTOR * k:
+                pool = pool[np.argpartition(-gains[pool], SHORTLIST_FACTOR * k - 1)[:SHORTLIST_FACTOR * k]]
+            with timed('round_gains'):
+                if cheap_gains:
+                    worlds.refresh_dominators()
+                gains[pool] = worlds.gains(pool) / r
+            fresh[pool] = True
+            evaluations += pool.size
+            heap = [(-gains[edge], edge) for edge in np.flatnonzero(queued).tolist()]
+            heapq.heapify(heap)
+            evaluations += refresh_top()
+
+        if not heap:
+            print(f"  Round {round_num+1}: No more candidate edges.", file=sys.stderr, flush=True)
+            break
+
+        if fresh[heap[0][1]]:
+            _, best_edge = heapq.heappop(heap)
+        else:
+            # Ran out of time mid-round: settle for the best gain evaluated so far
+            done = np.flatnonzero(fresh & queued & is_candidate)
+            if not done.size:
+                print(f"  Round {round_num+1}: Time budget reached, stopping.", file=sys.stderr, flush=True)
+                break
+            best_edge = int(done[np.argmax(gains[done])])
+            print(f"  Round {round_num+1}: Time budget reached mid-round, taking the best evaluated edge.",
+                  file=sys.stderr, flush=True)
+        queued[best_edge] = False
+        best_gain = gains[best_edge]
+        print(f"  Round {round_num+1}/{k}: {evaluations} lazy re-evaluations, "
+              f"{len(heap)} queued", file=sys.stderr, flush=True)
+
+        selected.append(best_edge)
+        bu, bv = edge_tuple(graph, best_edge)
+
+        print(f"    Selected edge ({bu}, {bv}) with gain {best_gain:.4f}",
+              file=sys.stderr, flush=True)
+
+        with timed('update'):
+            stale, is_candidate = worlds.block(best_edge)
+        fresh &= ~stale
+        stop = on_round is not None and on_round(selected)
+        slowest = max(slowest, time.perf_counter() - started)
+        if stop:
+            break
+
+    return selected
+
+
+# Candidates per selected edge that get exact initial gains when a proxy
+# shortlists the first round.
+SHORTLIST_FACTOR = 5
+
+
+def bfs_levels(graph, seeds):
+    """Hop distance of every node from the seeds (-1 where unreachable)."""
+    level = np.full(graph.node_ids.size, -1, dtype=np.int64)
+    frontier = np.unique(seeds)
+    depth = 0
+    while frontier.size:
+        level[frontier] = depth
+        heads = graph.indices[out_edges(graph.indptr, frontier)]
+        frontier = np.unique(heads[level[heads] < 0])
+        depth += 1
+    return level
+
+
+def proxy_scores(graph, seeds, live_counts):
+    """
+    Proxy gain per edge id: live_counts[e] (samples where e is live and
+    reached) times an estimate of how many nodes the head of e feeds.
+
+    The estimate walks the BFS levels of the graph backwards. Every node
+    counts itself, and a node at level L + 1 splits its estimate over its
+    in-edges from level L in proportion to their live counts, as in a soft
+    BFS tree built from the baseline samples.
+    """
+    level = bfs_levels(graph, seeds)
+    src_level = level[graph.src]
+    tree = (src_level >= 0) & (level[graph.indices] == src_level + 1)
+    arrivals = np.bincount(graph.indices[tree], weights=live_counts[tree], minlength=graph.node_ids.size)
+    downstream = np.ones(graph.node_ids.size, dtype=np.float64)
+    for depth in range(int(level.max()) - 1, -1, -1):
+        eids = np.flatnonzero(tree & (src_level == depth))
+        heads = graph.indices[eids]
+        share = np.divide(live_counts[eids], arrivals[heads], out=np.zeros(eids.size), where=arrivals[heads] > 0)
+        downstream += np.bincount(graph.src[eids], weights=share * downstream[heads],
+                                  minlength=graph.node_ids.size)
+    return live_counts * downstream[graph.indices]
+
+
+# Anytime mode: share of the remaining budget the planned run (setup and
+# all k rounds) may take, and the sample count of the pilot run that sizes r.
+BUDGET_SHARE = 0.7
+PILOT_SAMPLES = 64
+
+
+def fit_sample_count(run_cost, pilot_r, r, deadline):
+    """
+    Largest r (a multiple of 64, between pilot_r and the requested r) whose
+    whole run is expected to fit in BUDGET_SHARE of the time left, given the
+    pilot's estimate `run_cost` of setup plus all k rounds at pilot_r and
+    extrapolating linearly in the number of samples.
+    """
+    per_sample = run_cost / pilot_r
+    left = deadline - time.perf_counter()
+    fitted = int(BUDGET_SHARE * left / max(per_sample, 1e-9)) // 64 * 64
+    fitted = max(pilot_r, min(r, fitted))
+    print(f"  Pilot: {per_sample * 1e3:.2f} ms per sample, using r={fitted}", file=sys.stderr, flush=True)
+    return fitted
+
+
+def save_checkpoint_worlds(path, graph, seeds, hops, edge_words, r):
+    """Saved once, before any edge is blocked; the chosen edges go next to it."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        np.savez(f, edge_words=edge_words, r=r, hops=-1 if hops is None else hops,
+                 seeds=np.sort(seeds), graph=graph_digest(graph))
+    os.replace(tmp, path)
+    save_checkpoint_edges(path, [])
+
+
+def save_checkpoint_edges(path, edges):
+    tmp = f"{path}.edges.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(''.join(f"{e}\n" for e in edges))
+    os.replace(tmp, f"{path}.edges")
+
+
+def load_checkpoint(path, graph, seeds, hops):
+    """(edge_words, r, chosen edge ids), or None if there is no matching checkpoint."""
+    if not os.path.exists(path) or not os.path.exists(f"{path}.edges"):
+        return None
+    with np.load(path) as data:
+        if (str(data['graph']) != graph_digest(graph) or int(data['hops']) != (-1 if hops is None else hops)
+                or not np.array_equal(data['seeds'], np.sort(seeds))):
+            print(f"  Checkpoint {path} is for another graph, seed set or hop limit; ignoring it",
+                  file=sys.stderr, flush=True)
+            return None
+        edge_words, r = data['edge_words'], int(data['r'])
+    with open(f"{path}.edges") as f:
+        chosen = [int(line) for line in f if line.strip()]
+    return edge_words, r, chosen
+
+
+def evaluate_blocking(graph, seeds, live, hops, blocked):
+    """
+    Per-sample spread sizes over the packed worlds `live`, without and with
+    the edge ids `blocked` removed, each in one batched propagation.
+    """
+    r = live.shape[0]
+    edge_words = edge_sample_words(live, graph.probs.size)
+    before = sample_counts(propagate(graph, edge_words, seeds, sample_words(r), hops), r)
+    edge_words[blocked] = 0
+    after = sample_counts(propagate(graph, edge_words, seeds, sample_words(r), hops), r)
+    return before, after
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 10. Reverse-reachable sketches
+# ─────────────────────────────────────────────────────────────────────────────
+#
+# Alternative to re-simulating whole worlds: draw a random target node,
+# sample live in-edges lazily while walking backwards from it for at most
+# `hops` steps, and record which single edges cut every fire path that
+# reaches it. Blocking any one of those edges saves the target in that
+# sketch, so picking k edges becomes greedy max-coverage over the sketches;
+# coverage / theta * (#targets) estimates the saved nodes. Cuts that need two
+# or more blocked edges together are not credited.
+
+def build_reverse_csr(graph):
+    """(in_ptr, in_edges): edge ids grouped by head node, like indptr for tails."""
+    in_edges = np.argsort(graph.indices, kind='stable')
+    in_ptr = np.zeros(graph.node_ids.size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(graph.indices, minlength=graph.node_ids.size), out=in_ptr[1:])
+    return in_ptr, in_edges
+
+
+def _sketch_reaches(tails, heads, seeds_in_sketch, target, hops, skip=-1):
+    """Forward BFS over a sketch's edge list; True if `target` burns."""
+    succ = defaultdict(list)
+    for j, (x, y) in enumerate(zip(tails, heads)):
+        if j != skip:
+            succ[x].append(y)
+    seen = set(seeds_in_sketch)
+    frontier = list(seeds_in_sketch)
+    depth = 0
+    while frontier and (hops is None or depth < hops):
+        nxt = []
+        for x in frontier:
+            for y in succ.get(x, ()):
+                if y not in seen:
+                    if y == target:
+                        return True
+                    seen.add(y)
+                    nxt.append(y)
+        frontier = nxt
+        depth += 1
+    return target in seen
+
+
+def sample_rr_sketch(graph, reverse, is_seed, target, hops, rng):
+    """
+    One reverse-reachable sketch rooted at `target`. Returns the edge ids that
+    alone disconnect the target from the seeds within `hops`, or None when
+    the fire does not reach the target in this sample.
+    """
+    in_ptr, in_edges = reverse
+    dist_t = {target: 0}
+    frontier = [target]
+    tails, heads, eids = [], [], []
+    seeds_found = []
+    depth = 0
+    while frontier and (hops is None or depth < hops):
+        nxt = []
+        for y in frontier:
+            cand = in_edges[in_ptr[y]:in_ptr[y + 1]]
+            if not cand.size:
+                continue
+            cand = cand[rng.random(cand.size) < graph.probs[cand]]
+            for e, x in zip(cand.tolist(), graph.src[cand].tolist()):
+                tails.append(x)
+                heads.append(y)
+                eids.append(e)
+                if x in dist_t:
+                    continue
+                dist_t[x] = depth + 1
+                if is_seed[x]:
+                    seeds_found.append(x)
+                else:
+                    nxt.append(x)
+        frontier = nxt
+        depth += 1
+    if not seeds_found:
+        return None
+
+    # Forward distances from the seeds inside the sketch
+    succ = defaultdict(list)
+    for j, x in enumerate(tails):
+        succ[x].append(j)
+    dist_s = {x: 0 for x in seeds_found}
+    frontier = list(seeds_found)
+    while frontier:
+        nxt = []
+        for x in frontier:
+            for j in succ.get(x, ()):
+                y = heads[j]
+                if y not in dist_s:
+                    dist_s[y] = dist_s[x] + 1
+                    nxt.append(y)
+        frontier = nxt
+    total = dist_s[target]
+
+    # A single-edge cut lies on every shortest path, so it must be the only
+    # shortest-path edge leaving its level; confirm each such edge by BFS.
+    level_edges = defaultdict(list)
+    for j, (x, y) in enumerate(zip(tails, heads)):
+        if x in dist_s and dist_s[x] + 1 + dist_t[y] == total:
+            level_edges[dist_s[x]].append(j)
+    cuts = []
+    for js in level_edges.values():
+        if len(js) == 1 and not _sketch_reaches(tails, heads, seeds_found, target, hops, skip=js[0]):
+            cuts.append(eids[js[0]])
+    return cuts
+
+
+def rr_select(graph, seeds, k, theta, hops, rng):
+    """
+    Sketch-based alternative to greedy_select: samples `theta` RR sketches
+    and picks k edges by greedy max-coverage on the inverted edge -> sketch
+    index. Returns original (u, v) tuples.
+    """
+    is_seed = np.zeros(graph.node_ids.size, dtype=bool)
+    is_seed[seeds] = True
+    targets = np.flatnonzero(~is_seed)
+    if not targets.size:
+        return []
+    reverse = build_reverse_csr(graph)
+
+    print(f"  Sampling {theta} reverse-reachable sketches...", file=sys.stderr, flush=True)
+    index = defaultdict(list)
+    burned = 0
+    for sketch_id, target in enumerate(rng.choice(targets, size=theta).tolist()):
+        cuts = sample_rr_sketch(graph, reverse, is_seed, target, hops, rng)
+        if cuts is None:
+            continue
+        burned += 1
+        for e in cuts:
+            index[e].append(sketch_id)
+    scale = targets.size / theta
+    print(f"  Estimated baseline spread: {seeds.size + burned * scale:.2f}", file=sys.stderr, flush=True)
+    print(f"  Edges that cut at least one sketch: {len(index)}", file=sys.stderr, flush=True)
+
+    covered = np.zeros(theta, dtype=bool)
+    heap = [(-len(ids), e) for e, ids in index.items()]
+    heapq.heapify(heap)
+    selected = []
+    while heap and len(selected) < k:
+        neg, e = heapq.heappop(heap)
+        ids = index[e]
+        gain = int(np.count_nonzero(~covered[ids]))
+        if gain < -neg:
+            if gain:
+                heapq.heappush(heap, (-gain, e))
+            continue
+        covered[ids] = True
+        selected.append(edge_tuple(graph, e))
+        print(f"    Selected edge {selected[-1]} saving ~{gain * scale:.4f} nodes",
+              file=sys.stderr, flush=True)
+    return selected
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 11. Main
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _add_cache_args(parser):
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help="directory for cached pruned subgraphs and stored worlds")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="neither read nor write the cache; worlds are sampled in memory")
+    parser.add_argument('--refresh', action='store_true', help="rebuild the cached pruned subgraph")
+
+
+def load_pruned(graph_file, seeds, hops, cache_dir=None, refresh=False):
+    """
+    Pruned CSR graph for (graph file, seeds, hops), from the cache when
+    possible. Returns (graph, full graph or None if it was not loaded).
+    """
+    cache_path = pruned_cache_path(cache_dir, graph_file, seeds, hops) if cache_dir else None
+    if cache_path and not refresh and os.path.exists(cache_path):
+        print(f"Loading pruned graph from cache {cache_path}...", file=sys.stderr, flush=True)
+        graph, _ = load_cached_graph(cache_path)
+        full_graph = None
+    else:
+        print(f"Loading graph from {graph_file}...", file=sys.stderr, flush=True)
+        full_graph = load_graph(graph_file, seeds)
+        print(f"  Nodes: {full_graph.node_ids.size}, Edges: {full_graph.probs.size}",
+              file=sys.stderr, flush=True)
+
+        # Aggressive pruning
+        hops_label = -1 if hops is None else hops
+        print(f"Pruning graph (hops={hops_label})...", file=sys.stderr, flush=True)
+        graph = prune_graph(full_graph, node_index(full_graph, seeds), hops)
+        if cache_path:
+            save_graph(cache_path, graph)
+    print(f"  Pruned: {graph.node_ids.size} nodes, {graph.probs.size} edges",
+          file=sys.stderr, flush=True)
+    return graph, full_graph
+
+
+def evaluate_main(argv):
+    """
+    `forest_fire.py evaluate ...`: score a blocked-edge file on the stored
+    worlds of (graph, seed). Because every file is scored on the same worlds,
+    differences between two files are paired (common random numbers).
+    """
+    parser = argparse.ArgumentParser(
+        prog="forest_fire.py evaluate",
+        usage="python forest_fire.py evaluate <graph_file> <seed_file> <blocked_file> <r> <hops> [options]")
+    parser.add_argument('graph_file')
+    parser.add_argument('seed_file')
+    parser.add_argument('blocked_file', help="one \"u v\" edge per line, as written by the solver")
+    parser.add_argument('r', type=int)
+    parser.add_argument('hops', type=int, help="negative for unlimited")
+    parser.add_argument('--seed', type=int, default=42, help="RNG seed of the sampled worlds")
+    _add_cache_args(parser)
+    args = parser.parse_args(argv)
+    hops = None if args.hops < 0 else args.hops
+
+    seeds = load_seeds(args.seed_file)
+    graph, _ = load_pruned(args.graph_file, seeds, hops, None if args.no_cache else args.cache_dir,
+                           args.refresh)
+    if args.no_cache:
+        live = sample_worlds(graph, args.seed, 0, args.r)
+    else:
+        live = load_worlds(args.cache_dir, graph, args.seed, args.r)
+    blocked = _read_rows(args.blocked_file, 2).astype(np.int64)
+    blocked_ids = edge_ids(graph, blocked)
+    print(f"  Blocked: {len(blocked)} edges, {blocked_ids.size} of them in the pruned graph",
+          file=sys.stderr, flush=True)
+
+    before, after = evaluate_blocking(graph, node_index(graph, seeds), live, hops, blocked_ids)
+    saved = before - after
+    r = args.r
+    print(f"sigma_baseline {before.mean():.4f} +- {before.std() / np.sqrt(r):.4f}")
+    print(f"sigma_blocked {after.mean():.4f} +- {after.std() / np.sqrt(r):.4f}")
+    print(f"reduction {saved.mean():.4f} +- {saved.std() / np.sqrt(r):.4f}")
+
+
+# Per-process state of batch workers: (graph, hops, k, r, sample).
+_BATCH = None
+
+
+def _batch_init(graph, hops, k, r, cache_dir, world_seed, live):
+    global _BATCH
+    if live is None:
+        sample = lambda count: load_worlds(cache_dir, graph, world_seed, count)
+    else:
+        sample = lambda count: live[:count]
+    _BATCH = (graph, hops, k, r, sample)
+
+
+def _batch_solve(seeds):
+    graph, hops, k, r, sample = _BATCH
+    return greedy_select(graph, node_index(graph, seeds), k, r, hops, sample)
+
+
+def batch_main(argv):
+    """
+    `forest_fire.py batch ...`: one blocking plan per seed file on a shared
+    graph. The graph is loaded and pruned once from the union of all seed
+    sets; that region contains every scenario's own pruned region, so one
+    set of worlds sampled on it serves all scenarios. Scenarios run in
+    parallel over --workers processes.
+    """
+    parser = argparse.ArgumentParser(
+        prog="forest_fire.py batch",
+        usage="python forest_fire.py batch <graph_file> <output_dir> <k> <r> <hops> <seed_file>... [options]")
+    parser.add_argument('graph_file')
+    parser.add_argument('output_dir')
+    parser.add_argument('k', type=int)
+    parser.add_argument('r', type=int)
+    parser.add_argument('hops', type=int, help="negative for unlimited")
+    parser.add_argument('seed_files', nargs='+')
+    parser.add_argument('--workers', type=int, default=1,
+                        help="scenarios solved in parallel (0 = all cores)")
+    parser.add_argument('--seed', type=int, default=42, help="RNG seed of the sampled worlds")
+    _add_cache_args(parser)
+    args = parser.parse_args(argv)
+    hops = None if args.hops < 0 else args.hops
+    workers = args.workers or multiprocessing.cpu_count()
+
+    scenarios = [load_seeds(path) for path in args.seed_files]
+    union = set().union(*scenarios)
+    print(f"Scenarios: {len(scenarios)}, seeds in union: {len(union)}", file=sys.stderr, flush=True)
+    cache_dir = None if args.no_cache else args.cache_dir
+    graph, full_graph = load_pruned(args.graph_file, union, hops, cache_dir, args.refresh)
+
+    # Sample (or extend the store) once, before any worker maps it
+    live = None
+    if cache_dir:
+        load_worlds(cache_dir, graph, args.seed, args.r)
+    else:
+        live = sample_worlds(graph, args.seed, 0, args.r)
+    init_args = (graph, hops, args.k, args.r, args.cache_dir, args.seed, live)
+    if workers > 1 and len(scenarios) > 1:
+        ctx = multiprocessing.get_context()
+        with ctx.Pool(min(workers, len(scenarios)), initializer=_batch_init, initargs=init_args) as pool:
+            results = pool.map(_batch_solve, scenarios, chunksize=1)
+    else:
+        _batch_init(*init_args)
+        results = [_batch_solve(seeds) for seeds in scenarios]
+
+    def get_full_graph():
+        nonlocal full_graph
+        if full_graph is None:
+            full_graph = load_graph(args.graph_file, union)
+        return full_graph
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    used = set()
+    for path, seeds, selected in zip(args.seed_files, scenarios, results):
+        name = os.path.splitext(os.path.basename(path))[0]
+        while name in used:
+            name += '_'
+        used.add(name)
+        # Pad from the scenario's own pruned region, which lies inside the union's
+        region = prune_graph(graph, node_index(graph, seeds), hops)
+        selected = padded_answer(selected, args.k, adjacency(region), seeds, get_full_graph)
+        output_file = os.path.join(args.output_dir, f"{name}.txt")
+        write_output(output_file, selected)
+        print(f"Output written to {output_file} ({len(selected)} edges)", file=sys.stderr, flush=True)
+
+
+def main():
+    if sys.argv[1:2] == ['evaluate']:
+        return evaluate_main(sys.argv[2:])
+    if sys.argv[1:2] == ['batch']:
+        return batch_main(sys.argv[2:])
+
+    parser = argparse.ArgumentParser(
+        usage="python forest_fire.py <graph_file> <seed_file> <output_file> <k> <r> <hops> [options]")
+    parser.add_argument('graph_file')
+    parser.add_argument('seed_file')
+    parser.add_argument('output_file')
+    parser.add_argument('k', type=int)
+    parser.add_argument('r', type=int)
+    parser.add_argument('hops', type=int, help="negative for unlimited")
+    parser.add_argument('--mode', choices=['greedy', 'rr'], default='greedy',
+                        help="greedy re-simulation over r worlds, or RR sketches with r as the sketch budget")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes to shard the samples over (0 = all cores)")
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help="greedy mode: seconds for the whole run; r is scaled down to fit and the "
+                             "answer so far is written after every round")
+    parser.add_argument('--checkpoint', default=None,
+                        help="greedy mode: save worlds and selected edges here, and resume from it if it matches")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="greedy mode: start from few samples and add more (up to r) only when the "
+                             "best two edges of a round are statistically tied")
+    parser.add_argument('--delta', type=float, default=DELTA,
+                        help="error probability of the adaptive tie test and of the reported interval")
+    parser.add_argument('--seed', type=int, default=42, help="RNG seed of the sampled worlds")
+    _add_cache_args(parser)
+    args = parser.parse_args()
+    started = time.perf_counter()
+
+    graph_file = args.graph_file
+    seed_file = args.seed_file
+    output_file = args.output_file
+    k = args.k
+    r = args.r
+    hops_arg = args.hops
+    hops = None if hops_arg < 0 else hops_arg
+    workers = args.workers or multiprocessing.cpu_count()
+
+    seeds = load_seeds(seed_file)
+    print(f"Seeds: {len(seeds)} -> {sorted(seeds)[:10]}{'...' if len(seeds)>10 else ''}",
+          file=sys.stderr, flush=True)
+
+    graph, full_graph = load_pruned(graph_file, seeds, hops, None if args.no_cache else args.cache_dir,
+                                    args.refresh)
+
+    def get_full_graph():
+        nonlocal full_graph
+        if full_graph is None:
+            full_graph = load_graph(graph_file, seeds)
+        return full_graph
+
+    primary_adj = adjacency(graph)
+    padded = lambda chosen: padded_answer(chosen, k, primary_adj, seeds, get_full_graph)
+    rng = np.random.default_rng(args.seed)
+    if args.no_cache:
+        sample = lambda count: sample_worlds(graph, args.seed, 0, count)
+    else:
+        sample = lambda count: load_worlds(args.cache_dir, graph, args.seed, count)
+
+    if args.mode == 'rr':
+        print(f"Running RR-sketch selection (k={k}, sketches={r}, hops={hops_arg})...",
+              file=sys.stderr, flush=True)
+        selected = rr_select(graph, node_index(graph, seeds), k, r, hops, rng)
+    else:
+        deadline = None
+        on_round = None
+        if args.time_budget is not None:
+            deadline = started + args.time_budget
+            on_round = lambda chosen: write_output(output_file, padded(chosen))
+            on_round([])
+        print(f"Running greedy selection (k={k}, r={r}, hops={hops_arg})...",
+              file=sys.stderr, flush=True)
+        selected = greedy_select(graph, node_index(graph, seeds), k, r, hops, sample, workers,
+                                 deadline, args.checkpoint, on_round, args.adaptive, args.delta)
+
+    selected = padded(selected)
+    write_output(output_file, selected)
+    print(f"Output written to {output_file} ({len(selected)} edges)", file=sys.stderr, flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,20 +2,285 @@ from __future__ import annotations
 
 import time
 import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 import faiss
 import numpy as np
 
+# Trained IVF indexes are kept here, keyed by a fingerprint of the base
+# vectors and nlist, and memory-mapped on reuse.
+_INDEX_CACHE_DIR = os.environ.get(
+    "IVF_INDEX_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "ivf_index")
+)
+_FINGERPRINT_ROWS = 4096
+
+# "flat", "sq8", "pq" or "auto" (by index footprint vs available memory)
+_INDEX_KIND = os.environ.get("IVF_INDEX_KIND", "auto")
+_MEMORY_SHARE = 0.5
+# PQ results are re-ranked exactly over k * _PQ_RERANK candidates (0: off)
+_PQ_RERANK = int(os.environ.get("IVF_PQ_RERANK", "4"))
+_RERANK_CHUNK = 1024
+
+# Exact search: base rows per GEMM block, score-matrix elements per block,
+# and the share of the remaining budget the throughput model may plan for
+_EXACT_BASE_BLOCK = 1 << 16
+_EXACT_BLOCK_ELEMS = 1 << 24
+_EXACT_MARGIN = 0.8
+
+# nprobe planner: calibration queries, probe counts as fractions of nlist,
+# the budget share calibration may take, and the share the plan may fill
+_CALIBRATION_QUERIES = 512
+_CALIBRATION_FRACTIONS = (1 / 128, 1 / 32, 1 / 8)
+_CALIBRATION_SHARE = 0.05
+_PLAN_MARGIN = 0.85
+
+_BATCH_SIZE = 10000
+_MIN_BATCH = 256
+
+# Stop searching once no remaining query can change the top-K set
+_EARLY_STOP = os.environ.get("VOTE_EARLY_STOP", "0") == "1"
+
 def _t() -> float:
     return time.perf_counter()
 
-def _accumulate(I: np.ndarray, counts: np.ndarray) -> None:
-    valid = I.ravel()
-    valid = valid[valid >= 0]
-    counts += np.bincount(valid, minlength=counts.shape[0]).astype(np.int64)
+def _fingerprint(base_vectors: np.ndarray, nlist: int) -> str:
+    # Shape plus an evenly spaced row sample: hashing a 100M-row base in full
+    # would cost as much as the build it is meant to skip
+    N = base_vectors.shape[0]
+    rows = np.unique(np.linspace(0, N - 1, num=min(N, _FINGERPRINT_ROWS)).astype(np.int64))
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{base_vectors.shape}|{base_vectors.dtype}|{nlist}".encode())
+    h.update(np.ascontiguousarray(base_vectors[rows]).tobytes())
+    return h.hexdigest()
+
+def _available_memory() -> int:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+def _pq_subquantizers(d: int) -> int:
+    # One byte per 4 dimensions (16x smaller than float32), rounded to a divisor of d
+    m = max(1, d // 4)
+    while d % m:
+        m -= 1
+    return m
+
+def _choose_index_kind(N: int, d: int) -> str:
+    if _INDEX_KIND != "auto":
+        return _INDEX_KIND
+    budget = _MEMORY_SHARE * _available_memory()
+    code_bytes = {"flat": 4 * d, "sq8": d, "pq": _pq_subquantizers(d)}
+    for kind in ("flat", "sq8"):
+        if N * (code_bytes[kind] + 8) <= budget:
+            return kind
+    return "pq"
+
+def _build_ivf(base_vectors: np.ndarray, nlist: int, kind: str) -> faiss.Index:
+    N, d = base_vectors.shape
+    codec = {"flat": "Flat", "sq8": "SQ8", "pq": f"PQ{_pq_subquantizers(d)}"}[kind]
+    index = faiss.index_factory(d, f"IVF{nlist},{codec}", faiss.METRIC_L2)
+    if kind == "pq":
+        # Polysemous codes only serve Hamming pre-filtering, which we do not
+        # use, and their training dominates the build
+        index.do_polysemous_training = False
+    sample_size = min(N, nlist * 50)
+    index.train(base_vectors[:sample_size])
+    index.add(base_vectors)
+    return index
+
+def _load_or_build_index(base_vectors: np.ndarray, nlist: int, kind: str) -> faiss.Index:
+    path = os.path.join(_INDEX_CACHE_DIR, f"ivf{kind}_{_fingerprint(base_vectors, nlist)}.faiss")
+    if os.path.exists(path):
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+
+    index = _build_ivf(base_vectors, nlist, kind)
+    # The cache is best effort: faiss reports write failures as RuntimeError
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(_INDEX_CACHE_DIR, exist_ok=True)
+        faiss.write_index(index, tmp)
+        os.replace(tmp, path)
+    except (OSError, RuntimeError):
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+    return index
+
+def _rerank(base_vectors: np.ndarray, queries: np.ndarray, I: np.ndarray, k: int) -> np.ndarray:
+    # Exact L2 over the candidate rows. Rows are gathered in sorted order, so
+    # with a memory-mapped base only the touched pages are read
+    out = np.empty((I.shape[0], k), dtype=np.int64)
+    for s in range(0, I.shape[0], _RERANK_CHUNK):
+        cand = I[s:s + _RERANK_CHUNK]
+        rows, inv = np.unique(np.maximum(cand, 0), return_inverse=True)
+        vecs = np.asarray(base_vectors[rows], dtype=np.float32)[inv.reshape(cand.shape)]
+        diff = vecs - queries[s:s + _RERANK_CHUNK, None, :]
+        dist = np.einsum("qcd,qcd->qc", diff, diff)
+        dist[cand < 0] = np.inf
+        top = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        out[s:s + _RERANK_CHUNK] = np.take_along_axis(cand, top, axis=1)
+    return out
+
+def _search(index: faiss.Index, base_vectors: np.ndarray, queries: np.ndarray, k: int, rerank: int) -> np.ndarray:
+    if not rerank:
+        return index.search(queries, k)[1]
+    _, I = index.search(queries, k * rerank)
+    return _rerank(base_vectors, queries, I, k)
+
+def _exact_topk(queries: np.ndarray, base_vectors: np.ndarray, norms: np.ndarray, k: int) -> np.ndarray:
+    # ||q - x||^2 ranks like ||x||^2 - 2 q.x; a running top-k is merged per base block
+    nq = queries.shape[0]
+    best_d = np.full((nq, k), np.inf, dtype=np.float32)
+    best_i = np.full((nq, k), -1, dtype=np.int64)
+    for b0 in range(0, base_vectors.shape[0], _EXACT_BASE_BLOCK):
+        scores = queries @ base_vectors[b0:b0 + _EXACT_BASE_BLOCK].T
+        scores *= -2.0
+        scores += norms[b0:b0 + _EXACT_BASE_BLOCK]
+        kk = min(k, scores.shape[1])
+        part = np.argpartition(scores, kk - 1, axis=1)[:, :kk]
+        cand_d = np.concatenate([best_d, np.take_along_axis(scores, part, axis=1)], axis=1)
+        cand_i = np.concatenate([best_i, part + b0], axis=1)
+        keep = np.argpartition(cand_d, k - 1, axis=1)[:, :k]
+        best_d = np.take_along_axis(cand_d, keep, axis=1)
+        best_i = np.take_along_axis(cand_i, keep, axis=1)
+    return best_i
+
+def _exact_flops_rate(base_vectors: np.ndarray, queries: np.ndarray, k: int, query_block: int) -> float:
+    # Effective FLOP/s of one full-size block, top-k selection included
+    xb = base_vectors[:_EXACT_BASE_BLOCK]
+    norms = np.einsum("ij,ij->i", xb, xb)
+    qb = queries[:query_block]
+    t = _t()
+    _exact_topk(qb, xb, norms, k)
+    return 2.0 * qb.shape[0] * xb.shape[0] * xb.shape[1] / max(_t() - t, 1e-9)
+
+def _solve_exact(
+    base_vectors: np.ndarray, queries: np.ndarray, k: int, K: int, counts: np.ndarray,
+    query_block: int, deadline: float,
+) -> int:
+    norms = np.einsum("ij,ij->i", base_vectors, base_vectors)
+    Q = queries.shape[0]
+    done = 0
+    block_time = 0.0
+    top_count = 0
+    while done < Q and _t() + block_time < deadline:
+        t = _t()
+        end = min(done + query_block, Q)
+        top_count = max(top_count, _accumulate(_exact_topk(queries[done:end], base_vectors, norms, k), counts))
+        done = end
+        block_time = _t() - t
+        if _EARLY_STOP and top_count > Q - done and _settled(counts, K, Q - done):
+            break
+    return done
+
+def _plan_nprobe(
+    index: faiss.Index, base_vectors: np.ndarray, queries: np.ndarray, k: int, rerank: int,
+    nlist: int, deadline: float,
+) -> int:
+    # Fit seconds per query = a + b * nprobe on a calibration batch, then take
+    # the largest nprobe that gets every query through before the deadline
+    calib = queries[:_CALIBRATION_QUERIES]
+    cap = _CALIBRATION_SHARE * (deadline - _t())
+    t_start = _t()
+    probes, costs = [], []
+    for frac in _CALIBRATION_FRACTIONS:
+        index.nprobe = max(1, int(nlist * frac))
+        t = _t()
+        _search(index, base_vectors, calib, k, rerank)
+        probes.append(index.nprobe)
+        costs.append((_t() - t) / calib.shape[0])
+        if _t() - t_start > cap:
+            break
+    if len(probes) > 1 and probes[-1] > probes[0]:
+        b, a = np.polyfit(probes, costs, 1)
+        a = max(a, 0.0)
+    else:
+        a, b = 0.0, costs[-1] / probes[-1]
+    b = max(b, 1e-12)
+
+    per_query = _PLAN_MARGIN * (deadline - _t()) / queries.shape[0]
+    return int(min(nlist, max(1, (per_query - a) / b)))
+
+def _accumulate(I: np.ndarray, counts: np.ndarray) -> int:
+    # Scatter into the touched ids only (no O(N) bincount per batch); returns
+    # the highest count among them
+    ids, votes = np.unique(I[I >= 0], return_counts=True)
+    if not ids.size:
+        return 0
+    counts[ids] += votes
+    return int(counts[ids].max())
+
+def _settled(counts: np.ndarray, K: int, remaining: int) -> bool:
+    # An id gets at most one vote per query (its k neighbours are distinct),
+    # so once the K-th count leads the (K+1)-th by more than the remaining
+    # queries the top-K set is final
+    N = counts.shape[0]
+    if K >= N:
+        return False
+    part = np.partition(counts, (N - K - 1, N - K))
+    return int(part[N - K]) - int(part[N - K - 1]) > remaining
 
 def _rank(counts: np.ndarray, K: int) -> np.ndarray:
-    order = np.lexsort((np.arange(counts.shape[0], dtype=np.int64), -counts))
-    return order[:K].astype(np.int64)
+    # Count descending, then id ascending: select the K-th count in O(N) and
+    # sort only the ids above it plus the lowest tied ids
+    N = counts.shape[0]
+    if K < N:
+        kth = np.partition(counts, N - K)[N - K]
+        above = np.flatnonzero(counts > kth)
+        tied = np.flatnonzero(counts == kth)[:K - above.size]
+        top = np.concatenate([above, tied])
+    else:
+        top = np.arange(N)
+    order = np.lexsort((top, -counts[top]))
+    return top[order][:K].astype(np.int64)
+
+def _search_pipelined(
+    index: faiss.Index, base_vectors: np.ndarray, queries: np.ndarray, k: int, K: int,
+    rerank: int, counts: np.ndarray, deadline: float,
+) -> int:
+    # Batch i is searched while a worker accumulates batch i-1 (faiss drops
+    # the GIL). Each iteration's wall time, including the wait for the
+    # previous accumulation, drives the coasting estimate. Returns how many
+    # queries were counted.
+    Q = queries.shape[0]
+    batch = _BATCH_SIZE
+    sec_per_query = 0.0
+    start = done = top_count = 0
+    pending, pending_end = None, 0
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        while start < Q:
+            now = _t()
+            if now >= deadline:
+                break
+            if sec_per_query > 0.0 and now + sec_per_query * batch * 1.05 >= deadline:
+                batch = (int((deadline - now) / (sec_per_query * 1.5)) // _MIN_BATCH) * _MIN_BATCH
+                if batch < _MIN_BATCH:
+                    break
+
+            end = min(start + batch, Q)
+            I = _search(index, base_vectors, queries[start:end], k, rerank)
+            if pending is not None:
+                top_count = max(top_count, pending.result())
+                done, pending = pending_end, None
+                if _EARLY_STOP and top_count > Q - done and _settled(counts, K, Q - done):
+                    break
+            pending, pending_end = pool.submit(_accumulate, I, counts), end
+
+            current = (_t() - now) / (end - start)
+            sec_per_query = current if sec_per_query == 0.0 else 0.5 * sec_per_query + 0.5 * current
+            start = end
+
+        if pending is not None:
+            pending.result()
+            done = pending_end
+    return done
 
 def solve(
     base_vectors:  np.ndarray,
@@ -49,72 +314,32 @@ def solve(
     query_vectors = query_vectors[shuffled_indices]
 
     counts = np.zeros(N, dtype=np.int64)
+    if Q == 0:
+        return _rank(counts, K_out)
 
-    nlist = min(2048, max(512, int(4 * np.sqrt(N))))
-    
-    quantizer = faiss.IndexFlatL2(d)
-    index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_L2)
+    # Exact search when the measured GEMM throughput says all Q queries fit
+    query_block = max(1, _EXACT_BLOCK_ELEMS // min(N, _EXACT_BASE_BLOCK))
+    exact_sec = 2.0 * N * d * Q / _exact_flops_rate(base_vectors, query_vectors, k, query_block)
+    if exact_sec <= _EXACT_MARGIN * (deadline - _t()):
+        processed_queries = _solve_exact(base_vectors, query_vectors, k, K_out, counts, query_block, deadline)
+        print(f"Processed {processed_queries} / {Q} queries exactly using {num_cores} threads")
+        return _rank(counts, K_out)
 
-    sample_size = min(N, nlist * 50) 
-    index.train(base_vectors[:sample_size])
-    index.add(base_vectors)
+    nlist = min(2048, max(512, int(4 * np.sqrt(N))))
+    kind = _choose_index_kind(N, d)
+    rerank = _PQ_RERANK if kind == "pq" else 0
+    index = _load_or_build_index(base_vectors, nlist, kind)
 
     if _t() >= deadline:
         return _rank(counts, K_out)
 
-    if time_budget <= 25.0:
-        index.nprobe = 48      
-    elif time_budget <= 50.0:
-        index.nprobe = 96      
-    else:
-        index.nprobe = 256     
+    # Whatever the build left (all of it on a cache hit) goes into nprobe
+    index.nprobe = _plan_nprobe(index, base_vectors, query_vectors, k, rerank, nlist, deadline)
 
-    # --- DYNAMIC COASTING LOGIC ---
-    start = 0
-    _BATCH_SIZE = 10000 
-    avg_time_per_query = 0.0
-    processed_queries = 0
+    processed_queries = _search_pipelined(
+        index, base_vectors, query_vectors, k, K_out, rerank, counts, deadline
+    )
 
-    while start < Q:
-        now = _t()
-        if now >= deadline:
-            break
-            
-        if avg_time_per_query > 0.0:
-            expected_time = avg_time_per_query * _BATCH_SIZE * 1.05 # 5% buffer
-            
-            if now + expected_time >= deadline:
-                time_left = deadline - now
-                
-
-                safe_queries = int(time_left / (avg_time_per_query * 1.5))
-                
-                _BATCH_SIZE = (safe_queries // 256) * 256
-                
-                if _BATCH_SIZE < 256:
-                    break
-                    
-        end = min(start + _BATCH_SIZE, Q)
-        if end <= start:
-            break
-            
-        batch_count = end - start
-        
-        _, I = index.search(query_vectors[start:end], k)
-        _accumulate(I, counts)
-        processed_queries = end
-        
-        batch_time = _t() - now
-        current_speed = batch_time / batch_count
-        
-        # Exponential moving average of speed per query
-        if avg_time_per_query == 0.0:
-            avg_time_per_query = current_speed
-        else:
-            avg_time_per_query = 0.5 * avg_time_per_query + 0.5 * current_speed
-            
-        start = end
-
-    print(f"Processed {processed_queries} / {Q} queries with nprobe={index.nprobe} using {num_cores} threads")
+    print(f"Processed {processed_queries} / {Q} queries with {kind} nprobe={index.nprobe} using {num_cores} threads")
 
     return _rank(counts, K_out)
\ No newline at end of file